@@ -2,7 +2,7 @@
 import streamlit as st
 import pandas as pd
 from src.data_loader import DataLoader
-from src.models import HybridRecommender
+from src.model_store import ModelStore, CurrentModel
 from src.ui_components import set_page_config, inject_custom_css, render_anime_card
 import os
 
@@ -14,12 +14,11 @@ inject_custom_css()
 @st.cache_resource(show_spinner=True)
 def load_resources():
     loader = DataLoader()
-    anime_df, ratings_df = loader.load_data()
     
-    recommender = HybridRecommender(anime_df, ratings_df)
-    recommender.fit()
-    
-    return recommender, anime_df
+    # Memory-mapped load of the fitted model (fits and saves it on first run); reloaded when
+    # an offline build, refit or update saves a new artifact (see CurrentModel)
+    store = ModelStore()
+    return CurrentModel(store, store.load_or_build(loader))
 
 # UI Layout
 def main():
@@ -28,19 +27,31 @@ def main():
     
     # Load Data
     with st.spinner("Initializing Codex..."):
-        recommender, anime_df = load_resources()
+        recommender = load_resources().get()
+        anime_df = recommender.anime_df
     
     # Search Section
     st.markdown("### 🔍 Find recommendations based on")
     
+    # Single title or a whole watch list
+    mode = st.radio("Recommend from", ["A single anime", "My watch list"], horizontal=True, label_visibility="collapsed")
+    
     # Autocomplete
     all_anime_names = anime_df['name'].tolist()
-    selected_anime = st.selectbox(
-        "Select an anime you liked:",
-        options=[""] + all_anime_names,
-        format_func=lambda x: "Type to search..." if x == "" else x,
-        help="Start typing to search for an anime."
-    )
+    if mode == "A single anime":
+        selected_anime = st.selectbox(
+            "Select an anime you liked:",
+            options=[""] + all_anime_names,
+            format_func=lambda x: "Type to search..." if x == "" else x,
+            help="Start typing to search for an anime."
+        )
+    else:
+        selected_anime = st.multiselect(
+            "Select the anime you liked:",
+            options=all_anime_names,
+            placeholder="Type to search...",
+            help="Add every anime you enjoyed; they are combined into one taste profile."
+        )
     
     col1, col2, col3 = st.columns([1, 2, 1])
     with col2:
@@ -48,8 +59,18 @@ def main():
             if not selected_anime:
                 st.warning("Please select an anime first.")
             else:
-                with st.spinner(f"Analyzing {selected_anime} and finding match..."):
-                    recommendations, target_name = recommender.recommend(selected_anime, top_k=6)
+                if mode == "A single anime":
+                    with st.spinner(f"Analyzing {selected_anime} and finding match..."):
+                        recommendations, target_name = recommender.recommend(selected_anime, top_k=6)
+                else:
+                    with st.spinner(f"Analyzing your {len(selected_anime)} anime and finding matches..."):
+                        recommendations, matched_names = recommender.recommend_profile(selected_anime, top_k=6)
+                    if isinstance(matched_names, str):
+                        target_name = matched_names # Error message returned
+                    else:
+                        target_name = ", ".join(matched_names[:3])
+                        if len(matched_names) > 3:
+                            target_name += f" and {len(matched_names) - 3} more"
                 
                 if not recommendations:
                     st.error(target_name) # Error message returned
@@ -57,24 +78,12 @@ def main():
                     st.success(f"Because you liked **{target_name}**:")
                     st.markdown("---")
                     
-                    # Display Results - 2 rows of 3 cards
-                    # First row
-                    r_col1, r_col2, r_col3 = st.columns(3)
-                    with r_col1:
-                        render_anime_card(recommendations[0], 0)
-                    with r_col2:
-                        render_anime_card(recommendations[1], 1)
-                    with r_col3:
-                        render_anime_card(recommendations[2], 2)
-                    
-                    # Second row
-                    r_col4, r_col5, r_col6 = st.columns(3)
-                    with r_col4:
-                        render_anime_card(recommendations[3], 3)
-                    with r_col5:
-                        render_anime_card(recommendations[4], 4)
-                    with r_col6:
-                        render_anime_card(recommendations[5], 5)
+                    # Display Results - rows of 3 cards
+                    for row_start in range(0, len(recommendations), 3):
+                        for offset, r_col in enumerate(st.columns(3)):
+                            if row_start + offset < len(recommendations):
+                                with r_col:
+                                    render_anime_card(recommendations[row_start + offset], row_start + offset)
                         
                     # Detailed Explanation (Optional / Expandable)
                     with st.expander("ℹ️ Why these recommendations?"):
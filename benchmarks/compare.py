@@ -0,0 +1,62 @@
+import argparse
+import json
+import sys
+
+from benchmarks.run import RESULT_VERSION
+
+
+def metrics(result):
+    """Flat {metric: value} of a result file (lower is better for all of them)."""
+    flat = {}
+    for name, stage in result['stages'].items():
+        flat[f"{name}.seconds"] = stage['seconds']
+        flat[f"{name}.peak_rss_mb"] = stage['peak_rss_mb']
+    for name, lat in result['latency'].items():
+        flat[f"{name}.p50_ms"] = lat['p50_ms']
+        flat[f"{name}.p99_ms"] = lat['p99_ms']
+    return flat
+
+
+def compare(base, new, threshold=0.10):
+    """Rows of (metric, base, new, change) and the metrics that got worse by more than `threshold`."""
+    for result in (base, new):
+        if result.get('version') != RESULT_VERSION:
+            raise ValueError(f"Result version {result.get('version')} != {RESULT_VERSION}: rerun the benchmark.")
+    if base['scale'] != new['scale']:
+        raise ValueError(f"Different scales: {base['scale']} vs {new['scale']}")
+
+    base_metrics, new_metrics = metrics(base), metrics(new)
+    rows, regressions = [], []
+    for name in base_metrics:
+        if name not in new_metrics:
+            continue
+        old, value = base_metrics[name], new_metrics[name]
+        change = (value - old) / old if old else 0.0
+        rows.append((name, old, value, change))
+        if change > threshold:
+            regressions.append(name)
+    return rows, regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files (e.g. two commits).")
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative slowdown reported as a regression")
+    args = parser.parse_args()
+
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    for key in ['git_commit', 'cpu_count', 'platform']:
+        if base['environment'][key] != new['environment'][key]:
+            print(f"{key}: {base['environment'][key]} -> {new['environment'][key]}")
+
+    rows, regressions = compare(base, new, args.threshold)
+    print(f"{'metric':<32} {'base':>10} {'new':>10} {'change':>8}")
+    for name, old, value, change in rows:
+        flag = '  <-- regression' if name in regressions else ''
+        print(f"{name:<32} {old:>10.2f} {value:>10.2f} {change:>+8.1%}{flag}")
+    # Non-zero exit status on regressions (for CI)
+    sys.exit(1 if regressions else 0)
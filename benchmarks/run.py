@@ -0,0 +1,172 @@
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from benchmarks.synthetic import SCALES, generate
+
+# Bump when the result layout changes (benchmarks.compare refuses to mix versions)
+RESULT_VERSION = 1
+
+
+def _reset_peak_rss():
+    # Linux: writing 5 to clear_refs resets the peak RSS (VmHWM) of this process
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def _peak_rss_mb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # Elsewhere: the peak of the whole process (kB on Linux, bytes on macOS)
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+class StageTimer:
+    """Wall time and peak RSS of each named stage."""
+
+    def __init__(self):
+        self.stages = {}
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        _reset_peak_rss()
+        start = time.perf_counter()
+        yield
+        self.stages[name] = {'seconds': time.perf_counter() - start, 'peak_rss_mb': _peak_rss_mb()}
+        print(f"  {name}: {self.stages[name]['seconds']:.2f}s, peak RSS {self.stages[name]['peak_rss_mb']:.0f} MB")
+
+
+def latency(call, args, warmup=5):
+    """p50/p99/mean latency in ms of call(arg) over `args` (the first `warmup` calls are not counted)."""
+    for arg in args[:warmup]:
+        call(arg)
+    times = []
+    for arg in args[warmup:]:
+        start = time.perf_counter()
+        call(arg)
+        times.append((time.perf_counter() - start) * 1000)
+    times = np.array(times)
+    return {'n': len(times), 'p50_ms': float(np.percentile(times, 50)), 'p99_ms': float(np.percentile(times, 99)),
+            'mean_ms': float(times.mean())}
+
+
+def environment():
+    """Code version and machine of a run, so results are only compared like for like."""
+    import pandas, scipy, sklearn
+    def git(*args):
+        try:
+            return subprocess.run(['git', *args], capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+    return {
+        'git_commit': git('rev-parse', 'HEAD'),
+        'git_dirty': bool(git('status', '--porcelain', '--untracked-files=no')),
+        'python': platform.python_version(),
+        'numpy': np.__version__, 'pandas': pandas.__version__, 'scipy': scipy.__version__, 'sklearn': sklearn.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def run_scale(scale, data_dir, queries=200, ratings_mode='stream', memory_budget_mb=1024, engines=('svd', 'als'), seed=0):
+    """Benchmarks one scale: ingestion, each engine's fit, the hybrid fit and recommend latency."""
+    from src.data_loader import DataLoader
+    from src.models import ContentRecommender, CollaborativeRecommender, ImplicitRecommender, HybridRecommender
+
+    dataset = generate(data_dir, seed=seed, **SCALES[scale])
+    timer = StageTimer()
+    print(f"Scale {scale}: {dataset}")
+
+    # 1. Ingestion from the raw CSVs (previous outputs removed, so every run parses the text)
+    loader = DataLoader(data_dir, ratings_mode=ratings_mode, memory_budget_mb=memory_budget_mb,
+                        keep_unscored='als' in engines)
+    for path in [loader.anime_path, loader.ratings_path]:
+        if os.path.exists(path):
+            os.remove(path)
+    if os.path.isdir(loader.raw_ratings_parquet):
+        shutil.rmtree(loader.raw_ratings_parquet)
+    with timer.stage('ingest'):
+        anime_df, ratings_df = loader.load_data()
+
+    # 2. Each engine on its own
+    with timer.stage('fit_content'):
+        ContentRecommender(anime_df.copy()).fit()
+    if 'svd' in engines:
+        with timer.stage('fit_collab_svd'):
+            CollaborativeRecommender(ratings_df).fit()
+    if 'als' in engines:
+        with timer.stage('fit_collab_als'):
+            ImplicitRecommender(ratings_df).fit()
+
+    # 3. Hybrid model (engines fitted concurrently), live and precomputed-table recommend latency
+    model = HybridRecommender(anime_df.copy(), ratings_df, cache_size=0, collab_model=engines[0])
+    with timer.stage('fit_hybrid'):
+        model.fit()
+    names = list(np.random.default_rng(seed).choice(model.meta['name'], min(queries, len(anime_df)), replace=False))
+    results = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        results['recommend'] = latency(model.recommend, names)
+    with timer.stage('build_table'):
+        model.build_table()
+    with contextlib.redirect_stdout(io.StringIO()):
+        results['recommend_table'] = latency(model.recommend, names)
+
+    return {
+        'version': RESULT_VERSION,
+        'scale': scale,
+        'dataset': {**dataset, 'processed_anime': len(anime_df), 'processed_ratings': len(ratings_df)},
+        'options': {'ratings_mode': ratings_mode, 'memory_budget_mb': memory_budget_mb, 'engines': list(engines), 'queries': queries},
+        'environment': environment(),
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'stages': timer.stages,
+        'latency': results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark ingestion, model fits and recommend latency on synthetic data.")
+    parser.add_argument("--scales", nargs='+', choices=list(SCALES), default=['10k', '100k'])
+    parser.add_argument("--data-dir", default=os.path.join('benchmarks', 'data'), help="Synthetic datasets, one directory per scale")
+    parser.add_argument("--results-dir", default=os.path.join('benchmarks', 'results'))
+    parser.add_argument("--queries", type=int, default=200, help="recommend() calls per latency measurement")
+    parser.add_argument("--ratings-mode", choices=["head", "stream"], default="stream")
+    parser.add_argument("--memory-budget-mb", type=int, default=1024)
+    parser.add_argument("--engines", nargs='+', choices=['svd', 'als'], default=['svd', 'als'],
+                        help="Collaborative engines to fit (the first one is used by the hybrid model)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    os.makedirs(args.results_dir, exist_ok=True)
+    for scale in args.scales:
+        # A fresh process per scale: peak RSS and allocator state are not carried over
+        with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn')) as pool:
+            result = pool.submit(run_scale, scale, os.path.join(args.data_dir, scale), args.queries, args.ratings_mode,
+                                 args.memory_budget_mb, tuple(args.engines), args.seed).result()
+        commit = (result['environment']['git_commit'] or 'nogit')[:10]
+        stamp = result['timestamp'].replace(':', '').replace('-', '')[:15]
+        path = os.path.join(args.results_dir, f"{scale}-{commit}-{stamp}.json")
+        with open(path, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f"Wrote {path}")
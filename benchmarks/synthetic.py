@@ -0,0 +1,180 @@
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+
+# Dataset sizes of the benchmark suite (ratings are raw rows, before the loader's filtering)
+SCALES = {
+    '10k': {'n_anime': 2_000, 'n_users': 500, 'n_ratings': 10_000},
+    '100k': {'n_anime': 5_000, 'n_users': 3_000, 'n_ratings': 100_000},
+    '1m': {'n_anime': 20_000, 'n_users': 20_000, 'n_ratings': 1_000_000},
+    '100m': {'n_anime': 20_000, 'n_users': 1_000_000, 'n_ratings': 100_000_000},
+}
+
+GENRES = ['Action', 'Adventure', 'Comedy', 'Drama', 'Fantasy', 'Horror', 'Mecha', 'Music', 'Mystery', 'Psychological',
+          'Romance', 'School', 'Sci-Fi', 'Shounen', 'Shoujo', 'Slice of Life', 'Sports', 'Supernatural', 'Suspense', 'Thriller']
+TYPES = ['TV', 'Movie', 'OVA', 'ONA', 'Special', 'Music']
+SYLLABLES = ['ka', 'ri', 'to', 'mi', 'no', 'sa', 'ha', 'ru', 'ne', 'yo', 'shi', 'ta', 'ko', 'ma', 'zu', 're', 'chi', 'ga', 'ho', 'un']
+
+N_TOPICS = 50
+TOPIC_WORDS = 150
+COMMON_WORDS = 1000
+
+
+def _vocabulary(rng, size):
+    """`size` distinct pseudo-words of 2-4 syllables."""
+    words = set()
+    while len(words) < size:
+        n = rng.integers(2, 5, size - len(words))
+        for length in n:
+            words.add(''.join(rng.choice(SYLLABLES, length)))
+    return np.array(sorted(words))
+
+
+def _power_law(n, exponent, rng):
+    """Cumulative weights of a power law over n ranks (random rank order), for _sample."""
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    weights = weights[rng.permutation(n)]
+    return np.cumsum(weights) / weights.sum()
+
+
+def _sample(cdf, size, rng):
+    return np.minimum(np.searchsorted(cdf, rng.random(size)), len(cdf) - 1)
+
+
+def make_anime(n_anime, seed=0):
+    """Synthetic metadata in the anime-dataset-2023.csv layout.
+
+    Every anime belongs to one of N_TOPICS topics: its synopsis mixes words of
+    that topic with common words and its genres lean to the topic's genres, so
+    content similarity has structure to find. Returns (anime_df, topics).
+    """
+    rng = np.random.default_rng(seed)
+    words = _vocabulary(rng, N_TOPICS * TOPIC_WORDS + COMMON_WORDS)
+    common = words[N_TOPICS * TOPIC_WORDS:]
+    topic_genres = [rng.choice(len(GENRES), 3, replace=False) for _ in range(N_TOPICS)]
+    topic_cdf = _power_law(TOPIC_WORDS, 1.0, rng)
+    common_cdf = _power_law(COMMON_WORDS, 1.1, rng)
+
+    anime_ids = np.sort(rng.choice(3 * n_anime, n_anime, replace=False) + 1)
+    topics = rng.integers(0, N_TOPICS, n_anime)
+    rows = []
+    names = set()
+    for anime_id, topic in zip(anime_ids, topics):
+        # 1. Synopsis: ~60% topic words, the rest common words
+        length = int(rng.integers(40, 120))
+        n_topic = int(length * 0.6)
+        synopsis = np.concatenate([
+            words[topic * TOPIC_WORDS + _sample(topic_cdf, n_topic, rng)],
+            common[_sample(common_cdf, length - n_topic, rng)],
+        ])
+        rng.shuffle(synopsis)
+
+        # 2. Genres: 1-2 of the topic's genres, sometimes one more at random
+        genres = set(GENRES[g] for g in rng.choice(topic_genres[topic], int(rng.integers(1, 3)), replace=False))
+        if rng.random() < 0.3:
+            genres.add(GENRES[rng.integers(len(GENRES))])
+
+        # 3. Unique title (some sequels, to exercise the sequel filter)
+        name = ' '.join(w.title() for w in rng.choice(words[topic * TOPIC_WORDS:(topic + 1) * TOPIC_WORDS], 2))
+        if rng.random() < 0.1:
+            name += f" Season {rng.integers(2, 5)}"
+        if name in names:
+            name = f"{name} ({anime_id})"
+        names.add(name)
+
+        rows.append({
+            'anime_id': int(anime_id),
+            'Name': name,
+            'English name': name if rng.random() < 0.5 else 'UNKNOWN',
+            'Genres': ', '.join(sorted(genres)),
+            'Type': TYPES[min(int(rng.exponential(1.0)), len(TYPES) - 1)],
+            'Score': 'UNKNOWN' if rng.random() < 0.1 else f"{rng.normal(7.0, 0.8):.2f}",
+            'Episodes': str(int(rng.integers(1, 60))) if rng.random() < 0.95 else 'UNKNOWN',
+            'Synopsis': ' '.join(synopsis).capitalize() + '.',
+            'Image URL': f"https://example.invalid/anime/{anime_id}.jpg",
+        })
+    return pd.DataFrame(rows), topics
+
+
+def iter_ratings(anime_ids, topics, n_users, n_ratings, seed=0, block_rows=5_000_000):
+    """Yields (user_id, anime_id, my_score) blocks of power-law synthetic ratings.
+
+    User activity and anime popularity both follow power laws. Each user has a
+    favourite topic that 70% of their ratings come from. Scores are anime quality
+    + user bias + noise on 1-10, and 15% of rows are watched-but-unscored (0).
+    """
+    rng = np.random.default_rng(seed + 1)
+    user_cdf = _power_law(n_users, 1.0, rng)
+    anime_cdf = _power_law(len(anime_ids), 0.9, rng)
+    favourite = rng.integers(0, N_TOPICS, n_users)
+    user_bias = rng.normal(0, 1.0, n_users)
+    quality = rng.normal(7.0, 1.2, len(anime_ids))
+
+    # Anime grouped by topic, most popular first inside each topic
+    popularity = np.diff(np.concatenate([[0.0], anime_cdf]))
+    by_topic = np.lexsort((-popularity, topics))
+    topic_offsets = np.searchsorted(topics[by_topic], np.arange(N_TOPICS + 1))
+
+    for start in range(0, n_ratings, block_rows):
+        n = min(block_rows, n_ratings - start)
+        users = _sample(user_cdf, n, rng)
+        items = _sample(anime_cdf, n, rng)
+
+        # Ratings from the favourite topic: skewed towards the topic's popular anime
+        in_topic = rng.random(n) < 0.7
+        topic = favourite[users[in_topic]]
+        size = topic_offsets[topic + 1] - topic_offsets[topic]
+        has_anime = size > 0
+        rank = (size * rng.random(len(topic)) ** 3).astype(np.int64)
+        picked = items[in_topic]
+        picked[has_anime] = by_topic[topic_offsets[topic[has_anime]] + rank[has_anime]]
+        items[in_topic] = picked
+
+        scores = np.clip(np.rint(quality[items] + user_bias[users] + rng.normal(0, 1.0, n)), 1, 10).astype(np.int8)
+        scores[rng.random(n) < 0.15] = 0
+        yield users.astype(np.int32), anime_ids[items].astype(np.int32), scores
+
+
+def generate(out_dir, n_anime, n_users, n_ratings, seed=0, block_rows=5_000_000):
+    """Writes anime-dataset-2023.csv and final_animedataset.csv into `out_dir`.
+
+    The ratings file has only the columns the loader reads (user_id, anime_id,
+    my_score). Nothing is rewritten when `out_dir` already holds the same dataset
+    (same parameters and seed), so a scale is generated once and reused.
+    """
+    spec = {'n_anime': n_anime, 'n_users': n_users, 'n_ratings': n_ratings, 'seed': seed}
+    spec_path = os.path.join(out_dir, 'synthetic.json')
+    if os.path.exists(spec_path):
+        with open(spec_path) as f:
+            if json.load(f) == spec:
+                return spec
+    os.makedirs(out_dir, exist_ok=True)
+    print(f"Generating synthetic data in {out_dir}: {n_anime} anime, {n_users} users, {n_ratings} ratings")
+
+    anime_df, topics = make_anime(n_anime, seed)
+    anime_df.to_csv(os.path.join(out_dir, 'anime-dataset-2023.csv'), index=False)
+
+    schema = pa.schema([('user_id', pa.int32()), ('anime_id', pa.int32()), ('my_score', pa.int8())])
+    with pacsv.CSVWriter(os.path.join(out_dir, 'final_animedataset.csv'), schema) as writer:
+        for users, items, scores in iter_ratings(anime_df['anime_id'].to_numpy(), topics, n_users, n_ratings, seed, block_rows):
+            writer.write_table(pa.table({'user_id': users, 'anime_id': items, 'my_score': scores}, schema=schema))
+
+    # Spec last: a directory without it is an incomplete dataset
+    with open(spec_path, 'w') as f:
+        json.dump(spec, f, indent=2)
+    return spec
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic anime/ratings dataset in the raw CSV layouts.")
+    parser.add_argument("--scale", choices=list(SCALES), default='10k')
+    parser.add_argument("--out-dir", default=None, help="Default: benchmarks/data/<scale>")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    generate(args.out_dir or os.path.join('benchmarks', 'data', args.scale), seed=args.seed, **SCALES[args.scale])
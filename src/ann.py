@@ -0,0 +1,204 @@
+import argparse
+import time
+
+import numpy as np
+
+from src.ranking import top_k_indices
+
+
+class ExactIndex:
+    """Brute-force inner-product search (the reference the ANN indexes are measured against)."""
+
+    kind = 'exact'
+
+    def __init__(self, vectors, **params):
+        self.vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+
+    def vector(self, i):
+        return self.vectors[i]
+
+    def update(self, ids, vectors):
+        """Sets the vectors of `ids` (new ids extend the index)."""
+        n_items = max(len(self.vectors), int(ids.max()) + 1)
+        grown = np.zeros((n_items, self.vectors.shape[1]), dtype=np.float32)
+        grown[:len(self.vectors)] = self.vectors
+        grown[ids] = vectors
+        self.vectors = grown
+
+    def search(self, query, k, exclude=None):
+        """Returns (ids, scores) of the k vectors with the highest inner product, best first."""
+        scores = self.vectors @ np.asarray(query, dtype=np.float32)
+        top = top_k_indices(scores, k, exclude=exclude)
+        return top, scores[top]
+
+    def arrays(self):
+        return {'vectors': self.vectors}
+
+    @classmethod
+    def from_arrays(cls, arrays, **params):
+        index = cls.__new__(cls)
+        index.vectors = arrays['vectors']
+        return index
+
+
+class IVFIndex:
+    """Inverted-file index over L2-normalized vectors (inner product = cosine).
+
+    Vectors are clustered with spherical k-means into `n_lists` lists and stored
+    grouped by list. A query only scores the vectors in the `n_probe` lists whose
+    centroids are closest, so cost is ~ n_lists + n_probe * N / n_lists instead of N.
+    `n_probe` is the recall/latency knob (n_probe = n_lists is exact).
+    """
+
+    kind = 'ivf'
+
+    def __init__(self, vectors, n_lists=None, n_probe=8, n_iter=10, seed=42):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        n_lists = n_lists or max(1, int(np.sqrt(len(vectors))))
+        n_lists = min(n_lists, len(vectors))
+        self.n_probe = n_probe
+
+        self.centroids = self._kmeans(vectors, n_lists, n_iter, np.random.default_rng(seed))
+        self._store(vectors, self._assign(vectors, self.centroids))
+
+    def _store(self, vectors, assign):
+        # Store the vectors grouped by list; offsets[l]:offsets[l + 1] is list l
+        order = np.argsort(assign, kind='stable')
+        self.ids = order.astype(np.int32)
+        self.vectors = vectors[order]
+        self.offsets = np.searchsorted(assign[order], np.arange(len(self.centroids) + 1)).astype(np.int64)
+        self._build_inverse()
+
+    def _build_inverse(self):
+        # Original id -> slot in the grouped vectors
+        self.slots = np.empty(len(self.ids), dtype=np.int32)
+        self.slots[self.ids] = np.arange(len(self.ids), dtype=np.int32)
+
+    @staticmethod
+    def _assign(vectors, centroids, chunk=65536):
+        return np.concatenate([
+            np.argmax(vectors[start:start + chunk] @ centroids.T, axis=1)
+            for start in range(0, len(vectors), chunk)
+        ])
+
+    @classmethod
+    def _kmeans(cls, vectors, n_lists, n_iter, rng):
+        centroids = vectors[rng.choice(len(vectors), n_lists, replace=False)].copy()
+        for _ in range(n_iter):
+            assign = cls._assign(vectors, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, vectors)
+            counts = np.bincount(assign, minlength=n_lists)
+
+            # Empty lists are re-seeded from random vectors
+            empty = counts == 0
+            sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            centroids = sums / norms
+        return centroids.astype(np.float32)
+
+    def vector(self, i):
+        return self.vectors[self.slots[i]]
+
+    def update(self, ids, vectors):
+        """Sets the vectors of `ids` (new ids extend the index) and re-files them.
+
+        Centroids stay fixed: updated vectors go to their closest existing list,
+        so no k-means is run (rebuild the index to re-balance after many updates).
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        n_items = max(len(self.ids), int(ids.max()) + 1)
+        all_vectors = np.zeros((n_items, self.vectors.shape[1]), dtype=np.float32)
+        assign = np.zeros(n_items, dtype=np.int64)
+        all_vectors[self.ids] = self.vectors
+        assign[self.ids] = np.repeat(np.arange(len(self.centroids)), np.diff(self.offsets))
+        all_vectors[ids] = vectors
+        assign[ids] = self._assign(vectors, self.centroids)
+        self._store(all_vectors, assign)
+
+    def search(self, query, k, exclude=None, n_probe=None):
+        """Returns (ids, scores) of the (approximately) k best vectors, best first."""
+        query = np.asarray(query, dtype=np.float32)
+        n_probe = min(n_probe or self.n_probe, len(self.centroids))
+
+        # Closest lists, then exact scores inside them
+        lists = top_k_indices(self.centroids @ query, n_probe)
+        slots = np.concatenate([np.arange(self.offsets[l], self.offsets[l + 1]) for l in lists])
+        candidate_ids = self.ids[slots]
+        scores = self.vectors[slots] @ query
+
+        if exclude is not None:
+            keep = ~np.isin(candidate_ids, exclude)
+            candidate_ids, scores = candidate_ids[keep], scores[keep]
+        top = top_k_indices(scores, k)
+        return candidate_ids[top].astype(np.intp), scores[top]
+
+    def arrays(self):
+        return {'centroids': self.centroids, 'ids': self.ids, 'vectors': self.vectors, 'offsets': self.offsets}
+
+    @classmethod
+    def from_arrays(cls, arrays, n_probe=8, **params):
+        index = cls.__new__(cls)
+        index.n_probe = n_probe
+        for name, array in arrays.items():
+            setattr(index, name, array)
+        index._build_inverse()
+        return index
+
+
+INDEX_TYPES = {'exact': ExactIndex, 'ivf': IVFIndex}
+
+
+def build_index(vectors, kind='ivf', **params):
+    """Builds a nearest-neighbor index of type `kind` ('ivf' or 'exact')."""
+    return INDEX_TYPES[kind](vectors, **params)
+
+
+def load_index(kind, arrays, **params):
+    return INDEX_TYPES[kind].from_arrays(arrays, **params)
+
+
+def benchmark(vectors, k=50, n_queries=200, n_probes=(1, 2, 4, 8, 16, 32), seed=0, **index_params):
+    """Recall@k and latency of an IVF index against exact search, for each n_probe."""
+    exact = ExactIndex(vectors)
+    ivf = IVFIndex(vectors, **index_params)
+    queries = np.random.default_rng(seed).choice(len(vectors), min(n_queries, len(vectors)), replace=False)
+
+    def timed(search):
+        start = time.perf_counter()
+        results = [set(search(q)[0].tolist()) for q in queries]
+        return results, (time.perf_counter() - start) / len(queries) * 1000
+
+    truth, exact_ms = timed(lambda q: exact.search(exact.vector(q), k, exclude=q))
+    rows = [{'index': 'exact', 'n_probe': None, 'recall': 1.0, 'ms_per_query': exact_ms}]
+    for n_probe in n_probes:
+        found, ms = timed(lambda q: ivf.search(ivf.vector(q), k, exclude=q, n_probe=n_probe))
+        recall = np.mean([len(f & t) / max(len(t), 1) for f, t in zip(found, truth)])
+        rows.append({'index': 'ivf', 'n_probe': n_probe, 'recall': float(recall), 'ms_per_query': ms})
+    return rows
+
+
+if __name__ == "__main__":
+    from src.data_loader import DataLoader
+    from src.model_store import ModelStore
+
+    parser = argparse.ArgumentParser(description="Benchmark the IVF index against exact search on the fitted model.")
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--model-dir", default="models")
+    parser.add_argument("--k", type=int, default=50)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--n-lists", type=int, default=None)
+    parser.add_argument("--content-dims", type=int, default=128)
+    args = parser.parse_args()
+
+    model = ModelStore(args.model_dir).load_or_build(DataLoader(args.data_dir))
+    spaces = {
+        'collab (SVD item factors)': model.collab_engine.item_factors,
+        f'content (TF-IDF LSA, {args.content_dims} dims)': model.content_engine.embed(args.content_dims),
+    }
+    for name, vectors in spaces.items():
+        print(f"\n{name}: {len(vectors)} items")
+        print(f"{'index':<6} {'n_probe':>7} {'recall@' + str(args.k):>10} {'ms/query':>9}")
+        for row in benchmark(vectors, k=args.k, n_queries=args.queries, n_lists=args.n_lists):
+            print(f"{row['index']:<6} {str(row['n_probe'] or '-'):>7} {row['recall']:>10.3f} {row['ms_per_query']:>9.3f}")
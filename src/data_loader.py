@@ -1,26 +1,393 @@
 
 import pandas as pd
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
 import os
 import glob
 import logging
+import argparse
+import csv
+import json
+import shutil
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+# Columns the recommenders actually use (everything else is never read back)
+ANIME_COLUMNS = ['anime_id', 'name', 'english_name', 'genre', 'type', 'rating', 'episodes', 'synopsis', 'image_url']
+RATINGS_COLUMNS = ['user_id', 'anime_id', 'rating']
+
+# Raw ratings columns we parse, with explicit narrow dtypes
+RAW_RATINGS_TYPES = {'user_id': pa.int32(), 'anime_id': pa.int32(), 'my_score': pa.int8()}
+RAW_ANIME_COLUMNS = ['anime_id', 'Name', 'English name', 'Genres', 'Type', 'Score', 'Episodes', 'Synopsis', 'Image URL']
+# anime-dataset-2023.csv column -> processed column
+RAW_ANIME_RENAMES = {
+    'Name': 'name', 'English name': 'english_name', 'Genres': 'genre',
+    'Score': 'rating', 'Synopsis': 'synopsis', 'Image URL': 'image_url',
+    'Type': 'type', 'Episodes': 'episodes'
+}
+
+# Bytes held per kept rating in streaming mode (int32 user_id + int32 anime_id + int8 score)
+BYTES_PER_RATING = 9
 
 class DataLoader:
-    def __init__(self, data_dir="data"):
+    def __init__(self, data_dir="data", ratings_mode="head", memory_budget_mb=512,
+                 min_user_ratings=10, min_anime_ratings=10, reservoir=False, chunk_size=500_000,
+                 csv_engine="pyarrow", convert_raw=None, workers=1, range_bytes=64 << 20, keep_unscored=False):
         self.data_dir = data_dir
         
-        # Paths for processed data
-        self.anime_path = os.path.join(data_dir, "anime_processed.pkl")
-        self.ratings_path = os.path.join(data_dir, "ratings_processed.pkl")
+        # Also keep watched-but-unscored rows (my_score 0, stored as rating 0): implicit
+        # feedback for the ALS engine; the explicit SVD engine ignores them
+        self.keep_unscored = keep_unscored
+        
+        # Parse the raw ratings CSV in `workers` processes, one line-aligned byte range
+        # (~`range_bytes`) per task; 1 = in-process streaming reader
+        self.workers = workers
+        self.range_bytes = range_bytes
+        
+        # CSV parsing: "pyarrow" (multithreaded, explicit narrow dtypes) or "pandas" (C engine)
+        self.csv_engine = csv_engine
+        # Convert the raw ratings CSV to Parquet once and read that afterwards
+        # (default: only in "stream" mode, which reads the file twice anyway)
+        self.convert_raw = (ratings_mode == "stream") if convert_raw is None else convert_raw
+        
+        # Ratings ingestion for final_animedataset.csv:
+        #   "head":   first 2M valid ratings only (original prototype behaviour)
+        #   "stream": two passes over the whole file; pass 1 counts ratings per user/anime,
+        #             pass 2 keeps active users/anime within `memory_budget_mb`
+        #             (most active users first, or a uniform reservoir sample if `reservoir`)
+        self.ratings_mode = ratings_mode
+        self.memory_budget_mb = memory_budget_mb
+        self.min_user_ratings = min_user_ratings
+        self.min_anime_ratings = min_anime_ratings
+        self.reservoir = reservoir
+        self.chunk_size = chunk_size
+        
+        # Paths for processed data (columnar, compact dtypes)
+        self.anime_path = os.path.join(data_dir, "anime_processed.parquet")
+        self.ratings_path = os.path.join(data_dir, "ratings_processed.parquet")
+        
+        # Raw ratings, and their one-time Parquet conversion (directory of part files, plus the
+        # size/mtime of the CSV it was converted from: a replaced CSV is converted again)
+        self.raw_ratings_path = os.path.join(data_dir, "final_animedataset.csv")
+        self.raw_ratings_parquet = os.path.join(data_dir, "final_animedataset.parquet")
+        
+        # Legacy pickle caches from older versions (migrated on first load)
+        self.legacy_anime_path = os.path.join(data_dir, "anime_processed.pkl")
+        self.legacy_ratings_path = os.path.join(data_dir, "ratings_processed.pkl")
         
     def load_data(self):
         """Loads processed data if available, otherwise processes raw data."""
         if os.path.exists(self.anime_path) and os.path.exists(self.ratings_path):
             print("Loading pre-processed data...")
-            return pd.read_pickle(self.anime_path), pd.read_pickle(self.ratings_path)
+            return self._read_parquet(self.anime_path, ANIME_COLUMNS), self._read_parquet(self.ratings_path, RATINGS_COLUMNS)
+        
+        if os.path.exists(self.legacy_anime_path) and os.path.exists(self.legacy_ratings_path):
+            print("Migrating pre-processed pickle data to Parquet...")
+            anime_df, ratings_df = self._compact(pd.read_pickle(self.legacy_anime_path), pd.read_pickle(self.legacy_ratings_path))
+            self._save(anime_df, ratings_df)
+            return anime_df, ratings_df
         
         print("Processing raw data for the first time... This may take a while.")
         return self._process_raw_data()
     
+    def _read_parquet(self, path, columns):
+        # Memory-map the file and only read the columns we need (that it has)
+        available = set(pq.read_schema(path).names)
+        return pd.read_parquet(path, columns=[col for col in columns if col in available], memory_map=True)
+    
+    def _compact(self, anime_df, ratings_df):
+        """Narrows dtypes: int32 ids, int8 scores, categorical type/genre."""
+        return self._compact_anime(anime_df), self._compact_ratings(ratings_df)
+    
+    def _compact_anime(self, anime_df):
+        anime_df = anime_df[[col for col in ANIME_COLUMNS if col in anime_df]].reset_index(drop=True)
+        anime_df['anime_id'] = anime_df['anime_id'].astype(np.int32)
+        anime_df['type'] = anime_df['type'].astype('category')
+        anime_df['genre'] = anime_df['genre'].astype('category')
+        return anime_df
+    
+    def _compact_ratings(self, ratings_df):
+        ratings_df = ratings_df[RATINGS_COLUMNS].reset_index(drop=True)
+        return ratings_df.astype({'user_id': np.int32, 'anime_id': np.int32, 'rating': np.int8})
+    
+    def _save(self, anime_df, ratings_df):
+        anime_df.to_parquet(self.anime_path, index=False)
+        ratings_df.to_parquet(self.ratings_path, index=False)
+    
+    def read_update(self, anime_csv=None, ratings_csv=None):
+        """Reads a batch of new data for an incremental model update.
+        
+        `anime_csv` has the anime-dataset-2023.csv layout, `ratings_csv` the
+        final_animedataset.csv layout (valid ratings only, unless the loader keeps unscored rows).
+        Returns compact (anime_df, ratings_df); a part not given is None.
+        """
+        anime_df = ratings_df = None
+        if anime_csv:
+            anime_df = self._read_anime_csv(anime_csv).rename(columns=RAW_ANIME_RENAMES)
+            anime_df = self._compact_anime(anime_df.drop_duplicates(subset=['anime_id']).dropna(subset=['name']))
+        if ratings_csv:
+            table = self._open_ratings_csv(ratings_csv).read_all()
+            if not self.keep_unscored:
+                table = table.filter(pc.greater(table.column('my_score'), 0))
+            ratings_df = self._compact_ratings(self._ratings_frame(
+                table.column('user_id').to_numpy(), table.column('anime_id').to_numpy(), table.column('my_score').to_numpy()
+            ))
+        return anime_df, ratings_df
+    
+    def append(self, anime_df=None, ratings_df=None):
+        """Appends new anime (unseen ids only) and ratings to the processed files, for the next full refit."""
+        old_anime_df, old_ratings_df = self.load_data()
+        if anime_df is not None:
+            anime_df = pd.concat([old_anime_df, anime_df], ignore_index=True).drop_duplicates(subset=['anime_id'])
+        else:
+            anime_df = old_anime_df
+        if ratings_df is not None:
+            ratings_df = ratings_df[ratings_df['anime_id'].isin(anime_df['anime_id'])]
+            ratings_df = pd.concat([old_ratings_df, ratings_df], ignore_index=True)
+        else:
+            ratings_df = old_ratings_df
+        self._save(*self._compact(anime_df, ratings_df))
+    
+    def iter_rating_blocks(self):
+        """Yields (user_id, anime_id, score) arrays for all valid raw ratings, block by block.
+        
+        Reads the converted Parquet dataset if present, else the CSV; nothing is
+        filtered or capped (for out-of-core training, see CollaborativeRecommender.fit_streaming).
+        """
+        if not (self._has_raw_parquet() or os.path.exists(self.raw_ratings_path)):
+            raise FileNotFoundError(f"{self.raw_ratings_path} not found")
+        yield from self._iter_ratings(self.raw_ratings_path, valid_only=True)
+    
+    def _iter_ratings(self, ratings_path, valid_only=None):
+        """Yields (user_id, anime_id, score) arrays per chunk.
+        
+        Valid ratings (score > 0) only, unless `valid_only` is False (default:
+        False if the loader keeps unscored rows).
+        """
+        valid_only = not self.keep_unscored if valid_only is None else valid_only
+        min_score = 0 if valid_only else -1
+        if self._has_raw_parquet():
+            # Already converted: no text parsing, the score filter is pushed down to the scan
+            dataset = ds.dataset(self._raw_parquet_parts(), format='parquet')
+            batches = dataset.to_batches(columns=list(RAW_RATINGS_TYPES), filter=pc.field('my_score') > min_score,
+                                         batch_size=self.chunk_size)
+        elif self.workers > 1:
+            yield from self._iter_ratings_parallel(ratings_path, valid_only=valid_only)
+            return
+        elif self.csv_engine == "pyarrow":
+            batches = (batch.filter(pc.greater(batch.column('my_score'), min_score)) for batch in self._open_ratings_csv(ratings_path))
+        else:
+            df_iter = pd.read_csv(ratings_path, usecols=list(RAW_RATINGS_TYPES), chunksize=self.chunk_size,
+                                  dtype={col: str(t) for col, t in RAW_RATINGS_TYPES.items()})
+            for chunk in df_iter:
+                chunk = chunk[chunk['my_score'] > min_score]
+                yield (chunk['user_id'].to_numpy(), chunk['anime_id'].to_numpy(), chunk['my_score'].to_numpy())
+            return
+        
+        for batch in batches:
+            yield (batch.column('user_id').to_numpy(),
+                   batch.column('anime_id').to_numpy(),
+                   batch.column('my_score').to_numpy())
+    
+    def _iter_ratings_parallel(self, ratings_path, valid_only=True):
+        """Parses line-aligned byte ranges of the CSV in a process pool, yielding results in file order."""
+        with open(ratings_path, 'rb') as f:
+            header = next(csv.reader([f.readline().decode('utf-8')]))
+            data_start = f.tell()
+            
+            # Range boundaries snapped forward to the start of the next line
+            size = os.fstat(f.fileno()).st_size
+            boundaries = [data_start]
+            for offset in range(data_start + self.range_bytes, size, self.range_bytes):
+                f.seek(offset)
+                f.readline()
+                if f.tell() > boundaries[-1]:
+                    boundaries.append(f.tell())
+            if boundaries[-1] < size:
+                boundaries.append(size)
+        ranges = [(ratings_path, header, start, end, valid_only) for start, end in zip(boundaries, boundaries[1:]) if end > start]
+        
+        # Keep a bounded window of ranges in flight so results never pile up in memory
+        executor = ProcessPoolExecutor(max_workers=self.workers)
+        try:
+            pending = deque()
+            next_range = 0
+            while pending or next_range < len(ranges):
+                while next_range < len(ranges) and len(pending) < 2 * self.workers:
+                    pending.append(executor.submit(_parse_ratings_range, ranges[next_range]))
+                    next_range += 1
+                yield pending.popleft().result()
+        finally:
+            # Also stops outstanding work when the consumer stops early (head mode)
+            executor.shutdown(wait=True, cancel_futures=True)
+    
+    def _open_ratings_csv(self, ratings_path):
+        # Streaming, multithreaded pyarrow reader over only the three columns we use
+        return pacsv.open_csv(
+            ratings_path,
+            read_options=pacsv.ReadOptions(use_threads=True, block_size=64 << 20),
+            convert_options=pacsv.ConvertOptions(include_columns=list(RAW_RATINGS_TYPES), column_types=RAW_RATINGS_TYPES)
+        )
+    
+    def convert_raw_ratings(self, ratings_path=None):
+        """One-time conversion of the raw ratings CSV into a Parquet dataset (all rows, narrow dtypes).
+        
+        Replaces an earlier conversion; the CSV's size and mtime are stored with it (see _has_raw_parquet).
+        """
+        ratings_path = ratings_path or self.raw_ratings_path
+        tmp_path = self.raw_ratings_parquet + ".tmp"
+        print(f"Converting {ratings_path} to Parquet: {self.raw_ratings_parquet}")
+        source = self._csv_stamp(ratings_path)
+        if self.workers > 1:
+            # One part file per parsed byte range, written in file order
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            os.makedirs(tmp_path)
+            for i, (users, items, scores) in enumerate(self._iter_ratings_parallel(ratings_path, valid_only=False)):
+                part = pa.table({'user_id': users, 'anime_id': items, 'my_score': scores})
+                pq.write_table(part, os.path.join(tmp_path, f"part-{i}.parquet"))
+        else:
+            ds.write_dataset(self._open_ratings_csv(ratings_path), tmp_path, format='parquet',
+                             max_rows_per_file=20_000_000, max_rows_per_group=1_000_000,
+                             preserve_order=True, existing_data_behavior='delete_matching')
+        # '_' prefix: skipped by pyarrow/pandas dataset discovery, so the directory still reads as one table
+        with open(os.path.join(tmp_path, "_source.json"), 'w') as f:
+            json.dump(source, f)
+        
+        # os.replace() cannot overwrite a non-empty directory: move the old conversion aside first
+        old_path = self.raw_ratings_parquet + ".old"
+        shutil.rmtree(old_path, ignore_errors=True)
+        if os.path.isdir(self.raw_ratings_parquet):
+            os.replace(self.raw_ratings_parquet, old_path)
+        os.replace(tmp_path, self.raw_ratings_parquet)
+        shutil.rmtree(old_path, ignore_errors=True)
+    
+    @staticmethod
+    def _csv_stamp(path):
+        stat = os.stat(path)
+        return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    
+    def _has_raw_parquet(self):
+        """True if the converted ratings exist and match the current CSV (or the CSV was removed)."""
+        if not os.path.isdir(self.raw_ratings_parquet):
+            return False
+        if not os.path.exists(self.raw_ratings_path):
+            return True
+        try:
+            with open(os.path.join(self.raw_ratings_parquet, "_source.json")) as f:
+                return json.load(f) == self._csv_stamp(self.raw_ratings_path)
+        except (OSError, ValueError):
+            return False
+    
+    def _raw_parquet_parts(self):
+        # part-0, part-1, ..., part-10 in file (row) order, not lexicographic order
+        parts = glob.glob(os.path.join(self.raw_ratings_parquet, "part-*.parquet"))
+        return sorted(parts, key=lambda p: int(os.path.basename(p)[len("part-"):-len(".parquet")]))
+    
+    def _read_anime_csv(self, path):
+        if self.csv_engine != "pyarrow":
+            return pd.read_csv(path, usecols=RAW_ANIME_COLUMNS, dtype={'anime_id': 'int32'})
+        # Synopses contain quoted newlines; every column but the id is read as text
+        table = pacsv.read_csv(
+            path,
+            parse_options=pacsv.ParseOptions(newlines_in_values=True),
+            convert_options=pacsv.ConvertOptions(
+                include_columns=RAW_ANIME_COLUMNS,
+                column_types={col: (pa.int32() if col == 'anime_id' else pa.string()) for col in RAW_ANIME_COLUMNS},
+                strings_can_be_null=True
+            )
+        )
+        return table.to_pandas()
+    
+    def _head_ratings(self, ratings_path, limit_rows=2_000_000):
+        # 2 million ratings is plenty for good recs and keeps local runs fast
+        # (exactly the first `limit_rows`, independent of the reader's chunk size)
+        chunks = []
+        processed_rows = 0
+        for chunk in self._iter_ratings(ratings_path):
+            chunks.append(chunk)
+            processed_rows += len(chunk[0])
+            if processed_rows >= limit_rows:
+                break
+        return self._ratings_frame(*(np.concatenate(parts)[:limit_rows] for parts in zip(*chunks)))
+    
+    def _stream_ratings(self, ratings_path, anime_ids):
+        # Lookup table: is this anime_id in our metadata?
+        known_anime = np.zeros(int(anime_ids.max()) + 1, dtype=bool)
+        known_anime[anime_ids] = True
+        
+        def known(items):
+            mask = items < len(known_anime)
+            mask[mask] = known_anime[items[mask]]
+            return mask
+        
+        # Pass 1: count valid ratings per user and per anime (compact int32 counters)
+        user_counts = np.zeros(0, dtype=np.int32)
+        anime_counts = np.zeros(len(known_anime), dtype=np.int32)
+        for users, items, scores in self._iter_ratings(ratings_path):
+            mask = known(items)
+            user_counts = _add_counts(user_counts, users[mask])
+            anime_counts = _add_counts(anime_counts, items[mask])
+        
+        active_users = user_counts >= self.min_user_ratings
+        active_anime = anime_counts >= self.min_anime_ratings
+        
+        # Memory budget -> max ratings we can keep
+        max_rows = int(self.memory_budget_mb * 1024 * 1024) // BYTES_PER_RATING
+        expected_rows = int(user_counts[active_users].sum(dtype=np.int64))
+        print(f"Pass 1: {int(active_users.sum())} active users, {int(active_anime.sum())} active anime, "
+              f"<= {expected_rows} ratings (budget: {max_rows})")
+        
+        use_reservoir = self.reservoir and expected_rows > max_rows
+        if expected_rows > max_rows and not use_reservoir:
+            # Keep the most active users whose ratings fit in the budget
+            user_ids = np.flatnonzero(active_users)
+            by_activity = user_ids[np.argsort(-user_counts[user_ids], kind='stable')]
+            fits = np.cumsum(user_counts[by_activity], dtype=np.int64) <= max_rows
+            active_users = np.zeros_like(active_users)
+            active_users[by_activity[fits]] = True
+            expected_rows = int(user_counts[active_users].sum(dtype=np.int64))
+        
+        # Pass 2: keep ratings of active users on active anime, written into preallocated arrays
+        capacity = min(expected_rows, max_rows)
+        out_users = np.empty(capacity, dtype=np.int32)
+        out_items = np.empty(capacity, dtype=np.int32)
+        out_scores = np.empty(capacity, dtype=np.int8)
+        rng = np.random.default_rng(42)
+        seen = 0
+        for users, items, scores in self._iter_ratings(ratings_path):
+            mask = known(items)
+            mask[mask] = active_anime[items[mask]]
+            in_range = users < len(active_users)
+            mask &= in_range
+            mask[mask] = active_users[users[mask]]
+            users, items, scores = users[mask], items[mask], scores[mask]
+            n = len(users)
+            
+            if not use_reservoir:
+                out_users[seen:seen + n], out_items[seen:seen + n], out_scores[seen:seen + n] = users, items, scores
+            else:
+                # Reservoir sampling (Algorithm R, vectorized per chunk)
+                fill = max(0, min(n, capacity - seen))
+                out_users[seen:seen + fill], out_items[seen:seen + fill], out_scores[seen:seen + fill] = users[:fill], items[:fill], scores[:fill]
+                if fill < n:
+                    slots = rng.integers(0, np.arange(seen + fill, seen + n) + 1)
+                    replace = slots < capacity
+                    # Later rows overwrite earlier ones on the same slot, as in the sequential algorithm
+                    out_users[slots[replace]] = users[fill:][replace]
+                    out_items[slots[replace]] = items[fill:][replace]
+                    out_scores[slots[replace]] = scores[fill:][replace]
+            seen += n
+        
+        kept = min(seen, capacity)
+        return self._ratings_frame(out_users[:kept], out_items[:kept], out_scores[:kept])
+    
+    def _ratings_frame(self, users, items, scores):
+        return pd.DataFrame({'user_id': users, 'anime_id': items, 'rating': scores})
+    
     def _process_raw_data(self):
         # 1. Load Anime Metadata (prioritizing 2023 dataset for more fields)
         # Using basic anime.csv as fallback/base if needed, but 2023 has 'Image URL'
@@ -29,16 +396,9 @@ class DataLoader:
         anime_2023_path = os.path.join(self.data_dir, "anime-dataset-2023.csv")
         if os.path.exists(anime_2023_path):
              # Load relevant columns only to save memory
-            anime_df = pd.read_csv(anime_2023_path, usecols=[
-                'anime_id', 'Name', 'English name', 'Genres', 'Type', 'Score', 
-                'Episodes', 'Synopsis', 'Image URL'
-            ])
+            anime_df = self._read_anime_csv(anime_2023_path)
             # Rename for consistency
-            anime_df = anime_df.rename(columns={
-                'Name': 'name', 'English name': 'english_name', 'Genres': 'genre', 
-                'Score': 'rating', 'Synopsis': 'synopsis', 'Image URL': 'image_url',
-                 'Type': 'type', 'Episodes': 'episodes'
-            })
+            anime_df = anime_df.rename(columns=RAW_ANIME_RENAMES)
         else:
             # Fallback to older anime.csv
             print(f"Warning: {anime_2023_path} not found. Using basic anime.csv")
@@ -59,50 +419,23 @@ class DataLoader:
         # Options: final_animedataset.csv (4.5GB) or rating.csv
         # Let's try to find final_animedataset.csv first
         
-        ratings_path = os.path.join(self.data_dir, "final_animedataset.csv")
+        ratings_path = self.raw_ratings_path
         
         # We will use chunks to process the large file
         # Goal: Keep top users by activity and top anime by popularity to reduce matrix size
         
         if os.path.exists(ratings_path):
-            print(f"Processing large dataset: {ratings_path}")
+            print(f"Processing large dataset: {ratings_path} (mode: {self.ratings_mode})")
+            if self.convert_raw and not self._has_raw_parquet():
+                self.convert_raw_ratings(ratings_path)
             
-            # Strategy:
-            # 1. First pass: Count ratings per user and per anime
-            # 2. Filter: Keep users with > 50 ratings, Anime with > 50 ratings
-            # 3. Sample: If still too big, take top N users or random sample
-            
-            # Since we can't load 4.5GB into memory on all machines to filter, we iterate.
-            # However, for a prototype, let's try reading a significant sample or use the 'user_id' logic if available.
             # The 'final_animedataset.csv' has columns: username, anime_id, my_score, ...
-            
-            # Let's load just necessary columns
-            chunk_size = 500000
-            chunks = []
-            
-            # Heuristic limit: Load first 5 million rows? Or just robust sampling?
-            # Better: Load random sample or just valid ratings.
-            
-            # Let's load the first 2 million rows for the prototype to ensure speed
-            # 2 million ratings is plenty for good recs.
-            
-            df_iter = pd.read_csv(ratings_path, usecols=['user_id', 'anime_id', 'my_score'], chunksize=chunk_size)
-            
-            processed_rows = 0
-            limit_rows = 2_000_000 # 2 Million ratings max for local performance
-            
-            for chunk in df_iter:
-                # Filter valid ratings
-                chunk = chunk[chunk['my_score'] > 0] 
-                chunks.append(chunk)
-                processed_rows += len(chunk)
-                if processed_rows >= limit_rows:
-                    break
-            
-            ratings_df = pd.concat(chunks)
-            
-            # Rename
-            ratings_df = ratings_df.rename(columns={'my_score': 'rating'})
+            if self.ratings_mode == "stream":
+                # Whole file, two passes, bounded memory
+                ratings_df = self._stream_ratings(ratings_path, anime_df['anime_id'].to_numpy())
+            else:
+                # Prototype mode: the first 2 million valid ratings (fast, but biased to early users)
+                ratings_df = self._head_ratings(ratings_path)
             
         else:
             # Fallback to mall_ratings.csv or others
@@ -118,19 +451,66 @@ class DataLoader:
         # Ensure ratings only include anime we have metadata for
         ratings_df = ratings_df[ratings_df['anime_id'].isin(anime_df['anime_id'])]
         
-        # Filter users with too few ratings (cold start noise)
+        # Filter users with too few ratings (cold start noise), same threshold as stream pass 1
         user_counts = ratings_df['user_id'].value_counts()
-        active_users = user_counts[user_counts >= 10].index
+        active_users = user_counts[user_counts >= self.min_user_ratings].index
         ratings_df = ratings_df[ratings_df['user_id'].isin(active_users)]
 
         print(f"Processed Data: {len(anime_df)} Anime, {len(ratings_df)} Ratings")
         
         # Save optimized files
-        anime_df.to_pickle(self.anime_path)
-        ratings_df.to_pickle(self.ratings_path)
+        anime_df, ratings_df = self._compact(anime_df, ratings_df)
+        self._save(anime_df, ratings_df)
         
         return anime_df, ratings_df
 
+def _parse_ratings_range(task):
+    """Process-pool worker: parses one line-aligned byte range, returns compact filtered arrays."""
+    ratings_path, header, start, end, valid_only = task
+    with open(ratings_path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    table = pacsv.read_csv(
+        pa.py_buffer(data),
+        read_options=pacsv.ReadOptions(column_names=header, use_threads=False),
+        convert_options=pacsv.ConvertOptions(include_columns=list(RAW_RATINGS_TYPES), column_types=RAW_RATINGS_TYPES)
+    )
+    if valid_only:
+        table = table.filter(pc.greater(table.column('my_score'), 0))
+    return (table.column('user_id').to_numpy(),
+            table.column('anime_id').to_numpy(),
+            table.column('my_score').to_numpy())
+
+def _add_counts(counts, ids):
+    """Adds occurrence counts of non-negative `ids` to `counts`, growing it if needed."""
+    chunk_counts = np.bincount(ids)
+    if len(chunk_counts) > len(counts):
+        counts = np.pad(counts, (0, len(chunk_counts) - len(counts)))
+    counts[:len(chunk_counts)] += chunk_counts.astype(np.int32)
+    return counts
+
 if __name__ == "__main__":
-    loader = DataLoader()
-    loader.load_data()
+    parser = argparse.ArgumentParser(description="Process the raw anime/ratings CSVs into Parquet.")
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--ratings-mode", choices=["head", "stream"], default="head")
+    parser.add_argument("--memory-budget-mb", type=int, default=512)
+    parser.add_argument("--min-user-ratings", type=int, default=10)
+    parser.add_argument("--min-anime-ratings", type=int, default=10)
+    parser.add_argument("--reservoir", action="store_true", help="Uniformly sample ratings when over budget")
+    parser.add_argument("--reprocess", action="store_true", help="Ignore existing processed files")
+    parser.add_argument("--csv-engine", choices=["pyarrow", "pandas"], default="pyarrow")
+    parser.add_argument("--convert-raw", action="store_true", help="Convert the raw ratings CSV to Parquet first")
+    parser.add_argument("--workers", type=int, default=1, help="Processes parsing the raw ratings CSV")
+    parser.add_argument("--keep-unscored", action="store_true", help="Keep watched-but-unscored rows (implicit feedback)")
+    args = parser.parse_args()
+    
+    loader = DataLoader(args.data_dir, ratings_mode=args.ratings_mode, memory_budget_mb=args.memory_budget_mb,
+                        min_user_ratings=args.min_user_ratings, min_anime_ratings=args.min_anime_ratings,
+                        reservoir=args.reservoir, csv_engine=args.csv_engine, convert_raw=args.convert_raw or None,
+                        workers=args.workers, keep_unscored=args.keep_unscored)
+    if args.convert_raw:
+        loader.convert_raw_ratings()
+    if args.reprocess:
+        loader._process_raw_data()
+    else:
+        loader.load_data()
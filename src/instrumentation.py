@@ -0,0 +1,204 @@
+import cProfile
+import io
+import itertools
+import json
+import logging
+import os
+import pstats
+import random
+import threading
+import time
+from bisect import bisect_left
+
+# Span records go to this logger as one JSON object per line (INFO level)
+logger = logging.getLogger('anime_codex.spans')
+
+# Upper bounds (seconds) of the span duration histogram buckets
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+
+class Span:
+    """One timed stage (a context manager). Set `count` to the number of candidates/items it handled."""
+    __slots__ = ('tracer', 'name', 'trace_id', 'parent', 'count', 'seconds', '_start', '_profiler')
+
+    def __init__(self, tracer, name, count=None, profile=False):
+        self.tracer = tracer
+        self.name = name
+        self.count = count
+        self.trace_id = self.parent = self.seconds = None
+        self._profiler = profile
+
+    def __enter__(self):
+        tracer = self.tracer
+        if not tracer.enabled:
+            return self
+        stack = tracer._stack()
+        self.parent = stack[-1] if stack else None
+        self.trace_id = self.parent.trace_id if self.parent else f"{os.getpid():x}-{next(tracer._trace_ids):x}"
+        stack.append(self)
+        if self._profiler:
+            self._profiler = tracer._start_profile()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        tracer = self.tracer
+        if self.trace_id is None:
+            return False
+        self.seconds = time.perf_counter() - self._start
+        tracer._stack().pop()
+        if self._profiler:
+            self._profiler.disable()
+            tracer._dump_profile(self._profiler, self)
+        tracer._record(self)
+        return False
+
+
+class Tracer:
+    """Per-stage timing spans for fit and recommend.
+
+    Spans nest per thread: a span opened inside another is its child and shares
+    its trace id (use wrap() to carry the current span into a worker thread).
+    Every finished span is logged as JSON and added to a duration histogram and
+    a candidate counter per span name, exported in the Prometheus text format
+    (render_prometheus(), or write_prometheus() for the node-exporter textfile
+    collector; `metrics_path` rewrites that file after root spans, at most every
+    `metrics_interval` seconds). Root spans opened with trace() are profiled with
+    cProfile with probability `profile_rate`, dumped to `profile_dir` as .prof files
+    (or logged as the top functions without a directory).
+    """
+
+    def __init__(self, enabled=True, profile_rate=0.0, profile_dir=None, metrics_path=None, metrics_interval=15.0):
+        self.enabled = enabled
+        self.profile_rate = profile_rate
+        self.profile_dir = profile_dir
+        self.metrics_path = metrics_path
+        self.metrics_interval = metrics_interval
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._trace_ids = itertools.count(1)
+        # name -> [bucket counts..., +Inf count, sum of seconds, sum of counts]
+        self._stats = {}
+        self._last_write = 0.0
+
+    @classmethod
+    def from_env(cls):
+        """Tracer configured by ANIME_CODEX_{PROFILE_RATE, PROFILE_DIR, METRICS_FILE, TRACING}."""
+        return cls(
+            enabled=os.environ.get('ANIME_CODEX_TRACING', '1') != '0',
+            profile_rate=float(os.environ.get('ANIME_CODEX_PROFILE_RATE', 0.0)),
+            profile_dir=os.environ.get('ANIME_CODEX_PROFILE_DIR'),
+            metrics_path=os.environ.get('ANIME_CODEX_METRICS_FILE'),
+        )
+
+    def _stack(self):
+        try:
+            return self._local.stack
+        except AttributeError:
+            self._local.stack = []
+            return self._local.stack
+
+    def current(self):
+        """The innermost open span of this thread (None outside spans)."""
+        stack = self._stack()
+        return stack[-1] if stack else None
+
+    def span(self, name, count=None):
+        """Times the enclosed `with` block as stage `name`; binds the Span (set span.count)."""
+        return Span(self, name, count)
+
+    def trace(self, name, count=None):
+        """Root span of one request or fit (profiled with probability profile_rate)."""
+        return Span(self, name, count, profile=bool(self.profile_rate) and random.random() < self.profile_rate)
+
+    def _start_profile(self):
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler is active (e.g. a concurrent sampled request)
+            return None
+        return profiler
+
+    def wrap(self, fn):
+        """fn, run with the caller's current span as parent (for thread pools)."""
+        parent = self.current()
+        def run(*args, **kwargs):
+            if parent is None:
+                return fn(*args, **kwargs)
+            stack = self._stack()
+            stack.append(parent)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                stack.pop()
+        return run
+
+    def _record(self, span):
+        with self._lock:
+            stats = self._stats.get(span.name)
+            if stats is None:
+                stats = self._stats[span.name] = [0] * (len(BUCKETS) + 1) + [0.0, 0]
+            stats[bisect_left(BUCKETS, span.seconds)] += 1
+            stats[-2] += span.seconds
+            stats[-1] += span.count or 0
+        if span.parent is None and self.metrics_path and time.monotonic() - self._last_write >= self.metrics_interval:
+            self._last_write = time.monotonic()
+            self.write_prometheus(self.metrics_path)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps({
+                'span': span.name, 'trace': span.trace_id, 'parent': span.parent.name if span.parent else None,
+                'ms': round(span.seconds * 1000, 3), 'count': span.count,
+            }))
+
+    def _dump_profile(self, profiler, span):
+        if self.profile_dir:
+            os.makedirs(self.profile_dir, exist_ok=True)
+            profiler.dump_stats(os.path.join(self.profile_dir, f"{span.name}-{span.trace_id}.prof"))
+        else:
+            out = io.StringIO()
+            pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(15)
+            logger.info(json.dumps({'profile': span.name, 'trace': span.trace_id, 'stats': out.getvalue()}))
+
+    def snapshot(self):
+        """{span name: {'count', 'seconds', 'candidates'}} totals since start (or reset())."""
+        with self._lock:
+            return {name: {'count': sum(stats[:-2]), 'seconds': stats[-2], 'candidates': stats[-1]}
+                    for name, stats in self._stats.items()}
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+    def render_prometheus(self):
+        """Span histograms and candidate counters in the Prometheus text exposition format."""
+        with self._lock:
+            stats = {name: list(values) for name, values in self._stats.items()}
+        lines = [
+            '# HELP anime_codex_span_seconds Duration of instrumented fit/recommend stages.',
+            '# TYPE anime_codex_span_seconds histogram',
+        ]
+        for name in sorted(stats):
+            cumulative = 0
+            for bound, n in zip(BUCKETS + ('+Inf',), stats[name][:-2]):
+                cumulative += n
+                lines.append(f'anime_codex_span_seconds_bucket{{span="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'anime_codex_span_seconds_sum{{span="{name}"}} {stats[name][-2]:.9g}')
+            lines.append(f'anime_codex_span_seconds_count{{span="{name}"}} {cumulative}')
+        lines += [
+            '# HELP anime_codex_span_candidates_total Candidates/items handled by instrumented stages.',
+            '# TYPE anime_codex_span_candidates_total counter',
+        ]
+        lines += [f'anime_codex_span_candidates_total{{span="{name}"}} {stats[name][-1]}' for name in sorted(stats)]
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path):
+        # Written to a temp file and renamed, so the collector never reads a partial file
+        tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+        with open(tmp_path, 'w') as f:
+            f.write(self.render_prometheus())
+        os.replace(tmp_path, path)
+
+
+# Process-wide tracer used by the models
+tracer = Tracer.from_env()
@@ -0,0 +1,137 @@
+import mmap
+import sys
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from scipy.sparse import issparse
+
+
+class MemoryCounter:
+    """Bytes held by Python objects, each buffer counted once.
+
+    Views, and objects shared between components (e.g. anime_df held by the
+    hybrid model and the content engine), are only counted for the first
+    component measured. Arrays backed by a memory-mapped file are counted
+    separately as mapped bytes: they live in the page cache, are shared by every
+    process that maps the same file and can be evicted instead of swapped. Arrow
+    buffers count as mapped when read-only (Arrow's own allocations are mutable;
+    read-only ones are views of a memory-mapped file).
+    """
+
+    def __init__(self):
+        # id -> object: holding the objects keeps temporaries alive, so their ids are never reused
+        self.seen = {}
+
+    def measure(self, obj):
+        """(resident_bytes, mapped_bytes) of `obj` not counted by an earlier call."""
+        self.resident = self.mapped = 0
+        self._visit(obj)
+        return self.resident, self.mapped
+
+    def _first(self, obj, key=None):
+        key = id(obj) if key is None else key
+        if key in self.seen:
+            return False
+        self.seen[key] = obj
+        return True
+
+    def _visit(self, obj):
+        if obj is None or isinstance(obj, (bool, int, float, np.generic)):
+            return
+        if isinstance(obj, (str, bytes)):
+            if self._first(obj):
+                self.resident += sys.getsizeof(obj)
+        elif isinstance(obj, np.ndarray):
+            self._array(obj)
+        elif issparse(obj):
+            for part in ('data', 'indices', 'indptr', 'row', 'col'):
+                self._visit(getattr(obj, part, None))
+        elif isinstance(obj, pd.DataFrame):
+            if self._first(obj):
+                for col in obj.columns:
+                    self._visit(obj[col])
+                self._visit(obj.index)
+        elif isinstance(obj, pd.RangeIndex):
+            return
+        elif isinstance(obj, (pd.Series, pd.Index)):
+            # NumPy dtypes: a view of the underlying block; extension types: the array itself
+            self._visit(obj.to_numpy() if isinstance(obj.dtype, np.dtype) else obj.array)
+            if isinstance(obj, pd.Series):
+                # e.g. a name -> position lookup: the index is half of it
+                self._visit(obj.index)
+        elif isinstance(obj, pd.arrays.ArrowExtensionArray):
+            for chunk in obj.__arrow_array__().chunks:
+                for buffer in chunk.buffers():
+                    if buffer is not None:
+                        self._buffer(buffer)
+        elif isinstance(obj, pd.Categorical):
+            self._visit(obj.codes)
+            self._visit(obj.categories)
+        elif isinstance(obj, pd.api.extensions.ExtensionArray):
+            if self._first(obj):
+                self.resident += obj.nbytes
+        elif isinstance(obj, dict):
+            if self._first(obj):
+                self.resident += sys.getsizeof(obj)
+                for key, value in obj.items():
+                    self._visit(key)
+                    self._visit(value)
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            if self._first(obj):
+                self.resident += sys.getsizeof(obj)
+                for item in obj:
+                    self._visit(item)
+        elif self._first(obj):
+            # Any other object: its attributes
+            self.resident += sys.getsizeof(obj)
+            attrs = getattr(obj, '__dict__', None)
+            if attrs is not None:
+                for value in attrs.values():
+                    self._visit(value)
+            for name in getattr(type(obj), '__slots__', ()):
+                self._visit(getattr(obj, name, None))
+
+    def _array(self, array):
+        # Walk up to the buffer owner, so views share its count
+        root = array
+        while isinstance(root, np.ndarray) and isinstance(root.base, (np.ndarray, mmap.mmap, pa.Buffer)):
+            root = root.base
+        if isinstance(root, pa.Buffer):
+            self._buffer(root)
+            return
+        if not self._first(root):
+            return
+        if isinstance(root, mmap.mmap):
+            self.mapped += len(root)
+            return
+        self.resident += root.nbytes
+        if root.dtype == object:
+            for item in root.ravel():
+                self._visit(item)
+
+    def _buffer(self, buffer):
+        # Arrow buffers: a new Python object per access, so keyed on the memory they cover
+        if not self._first(buffer, key=('arrow', buffer.address, buffer.size)):
+            return
+        if buffer.is_mutable:
+            self.resident += buffer.size
+        else:
+            self.mapped += buffer.size
+
+
+def measure(components):
+    """{name: (resident_bytes, mapped_bytes)} for an ordered {name: object} mapping."""
+    counter = MemoryCounter()
+    return {name: counter.measure(obj) for name, obj in components.items()}
+
+
+def format_report(usage):
+    """Human-readable table of measure() output, largest first."""
+    lines = [f"{'component':<28} {'resident MB':>12} {'mapped MB':>10}"]
+    for name, (resident, mapped) in sorted(usage.items(), key=lambda item: -sum(item[1])):
+        lines.append(f"{name:<28} {resident / 2**20:>12.1f} {mapped / 2**20:>10.1f}")
+    resident = sum(r for r, _ in usage.values())
+    mapped = sum(m for _, m in usage.values())
+    lines.append(f"{'total':<28} {resident / 2**20:>12.1f} {mapped / 2**20:>10.1f}")
+    return '\n'.join(lines)
@@ -0,0 +1,257 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+
+from src.data_loader import DataLoader
+from src.models import HybridRecommender
+
+
+class ModelStore:
+    """Versioned store of fitted HybridRecommender artifacts.
+
+    Each artifact lives in `<model_dir>/<key>/`, where the key is a hash of the
+    processed input data, the model parameters and the artifact version. A new
+    process can then skip HybridRecommender.fit() and memory-map the arrays.
+    `<model_dir>/CURRENT` names the artifact last built or loaded, so worker
+    processes can attach() to it without reading the data.
+    """
+
+    def __init__(self, model_dir="models"):
+        self.model_dir = model_dir
+
+    def artifact_key(self, loader, params, **options):
+        digest = hashlib.sha256()
+        settings = {
+            'version': HybridRecommender.ARTIFACT_VERSION,
+            'params': {**HybridRecommender.DEFAULT_PARAMS, **params},
+        }
+        # Optional build steps (ANN indexes, content neighbors) only change the key when used
+        settings.update({name: value for name, value in options.items() if value})
+        digest.update(json.dumps(settings, sort_keys=True).encode())
+
+        # Hash the processed data files themselves (not mtimes: copies must hit the cache)
+        for path in [loader.anime_path, loader.ratings_path]:
+            digest.update(self._file_digest(path).encode())
+        return digest.hexdigest()[:16]
+
+    def _file_digest(self, path):
+        """SHA-256 of a file, remembered per (path, size, mtime) so unchanged data is not re-read on every start."""
+        stat = os.stat(path)
+        stamp = [os.path.abspath(path), stat.st_size, stat.st_mtime_ns]
+        memo_path = os.path.join(self.model_dir, 'data_digests.json')
+        try:
+            with open(memo_path) as f:
+                memo = json.load(f)
+        except (OSError, ValueError):
+            memo = {}
+        if memo.get(stamp[0], {}).get('stamp') == stamp:
+            return memo[stamp[0]]['sha256']
+
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        memo[stamp[0]] = {'stamp': stamp, 'sha256': digest.hexdigest()}
+        self._write_atomic(memo_path, json.dumps(memo), required=False)
+        return digest.hexdigest()
+
+    def _write_atomic(self, path, text, required=True):
+        # `required`=False: a read-only model directory only costs the shortcut, not the load
+        try:
+            os.makedirs(self.model_dir, exist_ok=True)
+            tmp_path = f"{path}.tmp-{os.getpid()}"
+            with open(tmp_path, 'w') as f:
+                f.write(text)
+            os.replace(tmp_path, path)
+        except OSError:
+            if required:
+                raise
+
+    def attach(self, mmap_mode='r'):
+        """Memory-maps the artifact named by CURRENT (fast worker start: the data is not hashed)."""
+        try:
+            with open(os.path.join(self.model_dir, 'CURRENT')) as f:
+                key = f.read().strip()
+        except FileNotFoundError:
+            raise ValueError(f"No current model in {self.model_dir}: build one with load_or_build() first.")
+        model = HybridRecommender.load(self.artifact_path(key), mmap_mode=mmap_mode)
+        model.model_key = key
+        return model
+
+    def artifact_path(self, key):
+        return os.path.join(self.model_dir, key)
+
+    def current_version(self):
+        """(key, manifest inode, manifest mtime) of the artifact CURRENT names, or None.
+
+        Changes whenever a build, refit or update is saved (a refit replaces the
+        artifact under the same key, so the key alone is not enough).
+        """
+        try:
+            with open(os.path.join(self.model_dir, 'CURRENT')) as f:
+                key = f.read().strip()
+            stat = os.stat(os.path.join(self.artifact_path(key), 'manifest.json'))
+        except OSError:
+            return None
+        return key, stat.st_ino, stat.st_mtime_ns
+
+    def build(self, loader, table_k=20, ann=None, content_neighbors=0, stream_collab=False, replace=False, **params):
+        """Fits a model from the loader's data and saves it. Returns (model, key).
+
+        `table_k` > 0 also precomputes the top-`table_k` recommendation table
+        served for the default weights. `ann` (e.g. 'ivf') also builds and saves
+        the approximate nearest-neighbor indexes (see HybridRecommender.enable_ann).
+        `content_neighbors` > 0 precomputes that many content neighbors per anime.
+        `stream_collab` trains the collaborative model on all raw ratings, streamed
+        from disk (CollaborativeRecommender.fit_streaming), instead of the processed
+        subset. `replace` overwrites an existing artifact with the same key (a scheduled
+        refit after incremental updates).
+        """
+        anime_df, ratings_df = loader.load_data()
+        key = self._options_key(loader, params, ann, content_neighbors, stream_collab)
+
+        model = HybridRecommender(anime_df, ratings_df, **params)
+        if stream_collab:
+            model.fit(rating_blocks=loader.iter_rating_blocks, min_user_ratings=loader.min_user_ratings,
+                      memory_budget_mb=loader.memory_budget_mb)
+        else:
+            model.fit()
+        if table_k:
+            model.build_table(table_k)
+        if ann:
+            model.enable_ann(ann)
+        if content_neighbors:
+            model.precompute_neighbors(content_neighbors)
+
+        self._save(model, key, replace)
+        return model, key
+        
+    def _options_key(self, loader, params, ann, content_neighbors, stream_collab):
+        if stream_collab:
+            # The raw ratings are too big to hash: identify them by path, size and mtime
+            path = loader.raw_ratings_parquet if os.path.isdir(loader.raw_ratings_parquet) else loader.raw_ratings_path
+            stat = os.stat(path)
+            stream_collab = [path, stat.st_size, stat.st_mtime_ns, loader.min_user_ratings]
+        return self.artifact_key(loader, params, ann=ann, content_neighbors=content_neighbors, stream_collab=stream_collab)
+        
+    def update(self, loader, anime_csv=None, ratings_csv=None, ann=None, content_neighbors=0, stream_collab=False, **params):
+        """Incremental update: folds new anime/ratings CSVs into the current model. Returns (model, key).
+        
+        The new rows are also appended to the processed data, and the updated model
+        is saved under the key of that data, so load_or_build() picks it up.
+        Refit on a schedule with build(..., replace=True).
+        """
+        model = self.load_or_build(loader, ann=ann, content_neighbors=content_neighbors, stream_collab=stream_collab, **params)
+        new_anime_df, new_ratings_df = loader.read_update(anime_csv, ratings_csv)
+        model.update(new_anime_df, new_ratings_df)
+        
+        loader.append(new_anime_df, new_ratings_df)
+        key = self._options_key(loader, params, ann, content_neighbors, stream_collab)
+        self._save(model, key, replace=True)
+        return model, key
+        
+    def _save(self, model, key, replace=False):
+        # Write to a temp dir and rename, so concurrent readers never see a partial artifact
+        path = self.artifact_path(key)
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        model.save(tmp_path)
+        if os.path.exists(path) and replace:
+            # Processes that memory-mapped the old files keep reading them until they reload
+            old_path = f"{path}.old-{os.getpid()}"
+            os.replace(path, old_path)
+            os.replace(tmp_path, path)
+            shutil.rmtree(old_path)
+        elif os.path.exists(path):
+            shutil.rmtree(tmp_path)
+        else:
+            os.replace(tmp_path, path)
+        model.model_key = key
+        self._write_atomic(os.path.join(self.model_dir, 'CURRENT'), key)
+        print(f"Saved model artifact: {path}")
+
+    def load_or_build(self, loader, ann=None, content_neighbors=0, stream_collab=False, **params):
+        """Loads the artifact matching the current data/params, building it if missing."""
+        options = dict(ann=ann, content_neighbors=content_neighbors, stream_collab=stream_collab)
+        if not (os.path.exists(loader.anime_path) and os.path.exists(loader.ratings_path)):
+            # Raw data not processed yet: the build will process it
+            return self.build(loader, **options, **params)[0]
+
+        key = self._options_key(loader, params, **options)
+        path = self.artifact_path(key)
+        if os.path.exists(os.path.join(path, 'manifest.json')):
+            print(f"Loading model artifact: {path}")
+            self._write_atomic(os.path.join(self.model_dir, 'CURRENT'), key, required=False)
+            return HybridRecommender.load(path)
+        return self.build(loader, **options, **params)[0]
+
+
+class CurrentModel:
+    """The model that `store`'s CURRENT names, for long-running processes.
+
+    get() returns `model` until a new artifact is saved (an offline build, --refit
+    or --update-*), then memory-maps that one instead; cached results go with the
+    old model. CURRENT is checked at most every `check_every` seconds (two stats).
+    """
+
+    def __init__(self, store, model, check_every=30):
+        self.store = store
+        self.model = model
+        self.check_every = check_every
+        self.version = store.current_version()
+        self.checked = time.monotonic()
+        self._lock = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            if time.monotonic() - self.checked >= self.check_every:
+                self.checked = time.monotonic()
+                version = self.store.current_version()
+                if version is not None and version != self.version:
+                    print(f"Model artifact changed: loading {version[0]}")
+                    self.model = self.store.attach()
+                    self.version = version
+            return self.model
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the HybridRecommender model artifact offline.")
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--model-dir", default="models")
+    parser.add_argument("--max-features", type=int, default=HybridRecommender.DEFAULT_PARAMS['max_features'])
+    parser.add_argument("--min-df", type=int, default=HybridRecommender.DEFAULT_PARAMS['min_df'])
+    parser.add_argument("--n-components", type=int, default=HybridRecommender.DEFAULT_PARAMS['n_components'])
+    parser.add_argument("--n-iter", type=int, default=HybridRecommender.DEFAULT_PARAMS['n_iter'], help="SVD power iterations")
+    parser.add_argument("--collab-model", choices=['svd', 'als'], default=HybridRecommender.DEFAULT_PARAMS['collab_model'],
+                        help="Collaborative engine: SVD on scores or implicit-feedback ALS")
+    parser.add_argument("--dtype", choices=['float64', 'float32'], default=HybridRecommender.DEFAULT_PARAMS['dtype'],
+                        help="Storage type of the collaborative factors")
+    parser.add_argument("--model-budget-mb", type=int, default=None,
+                        help="Memory budget of the fitted model: picks cheaper settings or fails fast (default: none)")
+    parser.add_argument("--memory-report", action="store_true", help="Print the memory used by each model component")
+    parser.add_argument("--stream-collab", action="store_true", help="Train the collaborative model on all raw ratings, streamed from disk")
+    parser.add_argument("--memory-budget-mb", type=int, default=512, help="Memory budget of --stream-collab")
+    parser.add_argument("--table-k", type=int, default=20, help="Precomputed recommendations per anime (0 = none)")
+    parser.add_argument("--ann", choices=['ivf', 'exact'], default=None, help="Also build nearest-neighbor indexes of this kind")
+    parser.add_argument("--content-neighbors", type=int, default=0, help="Precomputed content neighbors per anime (0 = none)")
+    parser.add_argument("--update-anime", default=None, help="CSV of new anime to fold into the current model")
+    parser.add_argument("--update-ratings", default=None, help="CSV of new ratings to fold into the current model")
+    parser.add_argument("--refit", action="store_true", help="Refit from scratch, replacing an incrementally updated artifact")
+    args = parser.parse_args()
+
+    store = ModelStore(args.model_dir)
+    loader = DataLoader(args.data_dir, memory_budget_mb=args.memory_budget_mb)
+    params = dict(max_features=args.max_features, min_df=args.min_df, n_components=args.n_components, n_iter=args.n_iter,
+                  collab_model=args.collab_model, dtype=args.dtype, model_budget_mb=args.model_budget_mb)
+    if args.update_anime or args.update_ratings:
+        model, _ = store.update(loader, args.update_anime, args.update_ratings, ann=args.ann,
+                     content_neighbors=args.content_neighbors, stream_collab=args.stream_collab, **params)
+    else:
+        model, _ = store.build(loader, table_k=args.table_k, ann=args.ann, content_neighbors=args.content_neighbors,
+                               stream_collab=args.stream_collab, replace=args.refit, **params)
+    if args.memory_report:
+        print(model.memory_report())
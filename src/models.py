@@ -1,221 +1,1526 @@
 
 import pandas as pd
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+from sklearn.feature_extraction.text import TfidfVectorizer, CountVectorizer, TfidfTransformer
 from sklearn.decomposition import TruncatedSVD
 from sklearn.preprocessing import MinMaxScaler
+from sklearn.utils.extmath import svd_flip
+from sklearn.pipeline import Pipeline
+from scipy.sparse import csr_matrix, vstack
+import pyarrow as pa
+import pyarrow.feather as feather
+from src.ranking import top_k_indices, top_k_rows, tie_key
+from src.ann import build_index, load_index
+from src.title_index import TitleIndex
+from src.string_array import StringArray
+from src.rec_table import RecommendationTable
+from src.result_cache import ResultCache
+from src.instrumentation import tracer
+from src.memory import measure, format_report
 import pickle
+import json
 import os
+import sys
+import uuid
+import multiprocessing
+from numbers import Integral
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+
+def fill_text(series):
+    """fillna('') that also works on categorical columns (e.g. genre/type from Parquet)."""
+    if isinstance(series.dtype, pd.CategoricalDtype) and '' not in series.cat.categories:
+        series = series.cat.add_categories('')
+    return series.fillna('')
+
 
 class ContentRecommender:
-    def __init__(self, anime_df):
+    def __init__(self, anime_df, max_features=5000, min_df=3, workers=None, chunk_docs=4096):
         self.anime_df = anime_df
+        self.max_features = max_features
+        self.min_df = min_df
+        # Tokenization runs in `workers` processes, `chunk_docs` documents per task
+        # (only when there are at least two chunks; see _fit_parallel)
+        self.workers = workers or os.cpu_count()
+        self.chunk_docs = chunk_docs
         self.tfidf_matrix = None
         self.indices = None
+        # Optional ANN index (build_ann_index) used by get_recommendations instead of a full scan
+        self.ann_index = None
+        # Optional precomputed top-K neighbors (precompute_neighbors): row positions + scores
+        self.neighbor_positions = None
+        self.neighbor_scores = None
         
     def fit(self):
         print("Training Content Recommender...")
         # Create a soup of metadata for TF-IDF
+        with tracer.span('content.soup', count=len(self.anime_df)):
+            self._add_soup(self.anime_df)
+        
+        # float32 CSR with L2-normalized rows (TfidfVectorizer's default norm), so the
+        # cosine similarity of two rows is their plain dot product
+        soup = self.anime_df['soup']
+        with tracer.span('content.tfidf', count=len(soup)):
+            if self.workers > 1 and len(soup) >= 2 * self.chunk_docs:
+                self.vectorizer, self.tfidf_matrix = self._fit_parallel(soup)
+            else:
+                self.vectorizer = TfidfVectorizer(stop_words='english', min_df=self.min_df, max_features=self.max_features, dtype=np.float32)
+                self.tfidf_matrix = self.vectorizer.fit_transform(soup).tocsr()
+        # The soup (synopsis x3) is only needed to fit: don't keep it in the shared anime_df
+        del soup
+        self.anime_df.drop(columns='soup', inplace=True)
+        
+        self._build_id_maps()
+        print("Content Recommender Trained.")
+        
+    def estimate_bytes(self, max_features=None, sample_size=500):
+        """Estimated bytes of the fitted TF-IDF matrix and of the soup needed to fit it.
+        
+        Tokenizes a sample of the catalogue: the matrix has ~(terms per document
+        among the sample's `max_features` most frequent) entries per anime, 8 bytes each.
+        """
+        max_features = max_features or self.max_features
+        if getattr(self, '_sample_counts', None) is None:
+            sample = self.anime_df.sample(min(sample_size, len(self.anime_df)), random_state=0).copy()
+            self._add_soup(sample)
+            counts = CountVectorizer(stop_words='english').fit_transform(sample['soup']).tocsc()
+            by_frequency = np.argsort(-np.asarray(counts.sum(axis=0)).ravel(), kind='stable')
+            self._sample_counts = (counts, by_frequency, sample['soup'].map(sys.getsizeof).mean())
+        counts, by_frequency, soup_bytes = self._sample_counts
+        kept = by_frequency[:max_features]
+        nnz = counts[:, kept].nnz / max(counts.shape[0], 1) * len(self.anime_df)
+        return {'tfidf': int(nnz * 8 + (len(self.anime_df) + 1) * 4), 'soup (fit only)': int(soup_bytes * len(self.anime_df))}
+        
+    def memory_components(self):
+        return {
+            'tfidf': self.tfidf_matrix,
+            'vectorizer': getattr(self, 'vectorizer', None),
+            'neighbors': [self.neighbor_positions, self.neighbor_scores],
+            'ann': [self.ann_index, getattr(self, 'lsa_components', None)],
+            'id_maps': [self.indices, getattr(self, 'anime_id_to_idx', None)],
+        }
+        
+    def _fit_parallel(self, soup):
+        """Same vocabulary and matrix as TfidfVectorizer.fit_transform, tokenized in parallel.
+        
+        Each process counts the terms of one chunk of documents. The chunk vocabularies
+        are merged, then min_df/max_features and the IDF weights are applied once on
+        the whole count matrix. Returns (vectorizer, tfidf_matrix); the vectorizer is
+        a count + IDF pipeline with the final vocabulary, for partial_fit().
+        """
+        chunks = [soup.iloc[start:start + self.chunk_docs].tolist() for start in range(0, len(soup), self.chunk_docs)]
+        # 'spawn': the pool may start while another thread runs BLAS (HybridRecommender.fit)
+        with ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            counted = list(pool.map(_count_terms, chunks))
+        
+        # 1. Merge the chunk vocabularies (sorted, as CountVectorizer sorts its features)
+        terms = np.unique(np.concatenate([names for names, _ in counted]))
+        blocks = []
+        for names, counts in counted:
+            counts.indices = np.searchsorted(terms, names)[counts.indices].astype(np.int32)
+            blocks.append(csr_matrix((counts.data, counts.indices, counts.indptr), shape=(counts.shape[0], len(terms))))
+        counts = vstack(blocks, format='csr')
+        
+        # 2. Vocabulary pruning, as CountVectorizer._limit_features (same tie order)
+        dfs = np.bincount(counts.indices, minlength=len(terms))
+        min_doc_count = self.min_df if isinstance(self.min_df, Integral) else self.min_df * counts.shape[0]
+        mask = dfs >= min_doc_count
+        if self.max_features is not None and mask.sum() > self.max_features:
+            tfs = np.asarray(counts.sum(axis=0)).ravel()
+            top = (-tfs[mask]).argsort()[:self.max_features]
+            new_mask = np.zeros(len(terms), dtype=bool)
+            new_mask[np.where(mask)[0][top]] = True
+            mask = new_mask
+        kept = np.where(mask)[0]
+        counts = counts[:, kept]
+        
+        # 3. IDF weights + L2 row normalization
+        count_vectorizer = CountVectorizer(
+            stop_words='english', vocabulary={term: i for i, term in enumerate(terms[kept].tolist())}, dtype=np.float32
+        )
+        idf = TfidfTransformer()
+        tfidf_matrix = idf.fit_transform(counts).tocsr()
+        return Pipeline([('counts', count_vectorizer), ('idf', idf)]), tfidf_matrix
+        
+    @staticmethod
+    def _add_soup(anime_df):
         # Filling NaNs
-        self.anime_df['genre'] = self.anime_df['genre'].fillna('')
-        self.anime_df['type'] = self.anime_df['type'].fillna('')
-        self.anime_df['synopsis'] = self.anime_df['synopsis'].fillna('')
-        self.anime_df['rating'] = self.anime_df['rating'].fillna(0)
+        anime_df['genre'] = fill_text(anime_df['genre'])
+        anime_df['type'] = fill_text(anime_df['type'])
+        anime_df['synopsis'] = fill_text(anime_df['synopsis'])
+        anime_df['rating'] = anime_df['rating'].fillna(0)
         
         # Weighted Soup: Synopsis gets highest weight for better plot-based recommendations
         # Synopsis is repeated 3x for high importance, Genre 2x for context, Type 1x
-        self.anime_df['soup'] = (
-            (self.anime_df['synopsis'] + " ") * 3 +  # High weight for plot similarity
-            (self.anime_df['genre'] + " ") * 2 +      # Medium weight for genre matching
-            self.anime_df['type']                      # Low weight for type
+        anime_df['soup'] = (
+            (anime_df['synopsis'] + " ") * 3 +  # High weight for plot similarity
+            (anime_df['genre'].astype(str) + " ") * 2 +  # Medium weight for genre matching
+            anime_df['type'].astype(str)                  # Low weight for type
         )
         
-        tfidf = TfidfVectorizer(stop_words='english', min_df=3, max_features=5000)
-        self.tfidf_matrix = tfidf.fit_transform(self.anime_df['soup'])
+    def partial_fit(self, new_anime_df):
+        """Appends new anime, vectorized with the fitted vocabulary and IDF weights.
+        
+        Returns the row positions of the new anime. Existing rows are unchanged (the
+        vocabulary is not re-learned: words unseen at fit time are ignored until a refit).
+        """
+        new_anime_df = new_anime_df.copy()
+        self._add_soup(new_anime_df)
+        new_rows = self.vectorizer.transform(new_anime_df['soup']).tocsr()
+        
+        start = self.tfidf_matrix.shape[0]
+        self.tfidf_matrix = vstack([self.tfidf_matrix, new_rows], format='csr', dtype=np.float32)
+        self.anime_df = pd.concat([self.anime_df, new_anime_df.drop(columns='soup')], ignore_index=True)
+        self._build_id_maps()
         
+        positions = np.arange(start, self.tfidf_matrix.shape[0])
+        if self.neighbor_positions is not None:
+            self._refresh_neighbors(positions)
+        if self.ann_index is not None:
+            self.ann_index.update(positions, self.project(new_rows))
+        return positions
+        
+    def _build_id_maps(self):
         # Mapping Name -> Index
         self.indices = pd.Series(self.anime_df.index, index=self.anime_df['name']).drop_duplicates()
-        print("Content Recommender Trained.")
+        
+        # Map anime_id to row position (first occurrence wins)
+        anime_ids = self.anime_df['anime_id'].to_numpy()
+        self.anime_id_to_idx = dict(zip(anime_ids[::-1], range(len(anime_ids) - 1, -1, -1)))
 
+    def embed(self, n_components=128):
+        """Dense, L2-normalized float32 LSA embedding of the TF-IDF rows (for the ANN index)."""
+        n_components = min(n_components, self.tfidf_matrix.shape[1] - 1)
+        svd = TruncatedSVD(n_components=n_components, random_state=42).fit(self.tfidf_matrix)
+        self.lsa_components = svd.components_.astype(np.float32)
+        return self.project(self.tfidf_matrix)
+        
+    def project(self, rows):
+        """Embeds TF-IDF rows with the fitted LSA components (see embed)."""
+        embedding = np.asarray(rows @ self.lsa_components.T, dtype=np.float32)
+        norms = np.linalg.norm(embedding, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return embedding / norms
+        
+    def build_ann_index(self, kind='ivf', n_components=128, rerank=4, **params):
+        """Indexes the reduced content embedding; get_recommendations then searches it.
+        
+        The index only proposes `rerank * top_n` candidates: they are re-scored with
+        the exact TF-IDF cosine, so scores keep the same scale as the full scan.
+        """
+        self.ann_index = build_index(self.embed(n_components), kind, **params)
+        self.ann_rerank = rerank
+        
+    def _similarities(self, rows):
+        """Cosine similarity of `rows` (normalized CSR) with every item: one sparse product, dense (n_rows, N) result."""
+        return (rows @ self.tfidf_matrix.T).toarray()
+        
+    def precompute_neighbors(self, k=50, chunk_size=256):
+        """Precomputes the top-k content neighbors of every item.
+        
+        The similarity matrix is built `chunk_size` rows at a time (sparse x sparse
+        product), so at most chunk_size x N scores are in memory at once.
+        get_recommendations then answers top_n <= k from these arrays.
+        """
+        n_items = self.tfidf_matrix.shape[0]
+        k = min(k, n_items - 1)
+        self.neighbor_positions = np.empty((n_items, k), dtype=np.int32)
+        self.neighbor_scores = np.empty((n_items, k), dtype=np.float32)
+        self._compute_neighbors(np.arange(n_items), chunk_size)
+        
+    def _compute_neighbors(self, rows, chunk_size=256):
+        k = self.neighbor_positions.shape[1]
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start:start + chunk_size]
+            sim = self._similarities(self.tfidf_matrix[chunk])
+            top = top_k_rows(sim, k, exclude=chunk)
+            self.neighbor_positions[chunk] = top
+            self.neighbor_scores[chunk] = np.take_along_axis(sim, top, axis=1)
+        
+    def _refresh_neighbors(self, new_positions):
+        """Updates the precomputed neighbors after rows `new_positions` were appended.
+        
+        Only the new rows and the old rows for which a new anime beats their current
+        k-th neighbor are recomputed.
+        """
+        n_old = len(self.neighbor_positions)
+        k = self.neighbor_positions.shape[1]
+        best_new = (self.tfidf_matrix[:n_old] @ self.tfidf_matrix[new_positions].T).max(axis=1).toarray().ravel()
+        stale = np.flatnonzero(best_new > self.neighbor_scores[:, -1])
+        
+        # Grown copies (the loaded arrays may be read-only memory maps)
+        positions = np.empty((self.tfidf_matrix.shape[0], k), dtype=np.int32)
+        scores = np.empty((self.tfidf_matrix.shape[0], k), dtype=np.float32)
+        positions[:n_old], scores[:n_old] = self.neighbor_positions, self.neighbor_scores
+        self.neighbor_positions, self.neighbor_scores = positions, scores
+        self._compute_neighbors(np.concatenate([stale, new_positions]))
+        
     def get_recommendations(self, anime_id, top_n=20):
-        # Get index from anime_id
-        idx = self.anime_df.index[self.anime_df['anime_id'] == anime_id].tolist()
-        if not idx:
+        # Get row position from anime_id
+        if anime_id not in self.anime_id_to_idx:
             return {}
-        idx = idx[0]
+        idx = self.anime_id_to_idx[anime_id]
+        
+        if self.neighbor_positions is not None and top_n <= self.neighbor_positions.shape[1]:
+            anime_indices = self.neighbor_positions[idx, :top_n]
+            rec_ids = self.anime_df['anime_id'].values[anime_indices]
+            return dict(zip(rec_ids, self.neighbor_scores[idx, :top_n]))
+        
+        if self.ann_index is not None:
+            # Approximate candidates, exact cosine on those only (TF-IDF rows are L2-normalized)
+            candidates, _ = self.ann_index.search(self.ann_index.vector(idx), top_n * self.ann_rerank, exclude=idx)
+            cosine_sim = (self.tfidf_matrix[candidates] @ self.tfidf_matrix[idx].T).toarray().ravel()
+            top = top_k_indices(cosine_sim, top_n)
+            rec_ids = self.anime_df['anime_id'].values[candidates[top]]
+            return dict(zip(rec_ids, cosine_sim[top]))
         
         # Cosine Similarity
         # Efficiently compute only for the validation vector
-        cosine_sim = cosine_similarity(self.tfidf_matrix[idx], self.tfidf_matrix).flatten()
-        
-        # Get scores
-        sim_scores = list(enumerate(cosine_sim))
-        sim_scores = sorted(sim_scores, key=lambda x: x[1], reverse=True)
+        cosine_sim = self._similarities(self.tfidf_matrix[idx]).ravel()
         
         # Top N (excluding self)
-        sim_scores = sim_scores[1:top_n+1]
+        anime_indices = top_k_indices(cosine_sim, top_n, exclude=idx)
         
         # Return Dict {anime_id: score}
-        anime_indices = [i[0] for i in sim_scores]
-        scores = [i[1] for i in sim_scores]
+        rec_ids = self.anime_df['anime_id'].values[anime_indices]
+        return dict(zip(rec_ids, cosine_sim[anime_indices]))
+        
+    def get_profile_recommendations(self, anime_ids, seed_weights=None, top_n=20):
+        """Scores the catalogue against the (weighted) sum of several anime's TF-IDF rows.
+        
+        Same return format as get_recommendations; the seed anime are excluded.
+        """
+        idx = np.array([self.anime_id_to_idx.get(aid, -1) for aid in anime_ids], dtype=np.intp)
+        seed_weights = np.ones(len(idx)) if seed_weights is None else np.asarray(seed_weights, dtype=np.float64)
+        found = idx >= 0
+        idx, seed_weights = idx[found], seed_weights[found]
+        if not len(idx):
+            return {}
         
-        rec_ids = self.anime_df.iloc[anime_indices]['anime_id'].values
-        return dict(zip(rec_ids, scores))
+        # One query vector for the whole profile, L2-normalized like the rows
+        query = csr_matrix(seed_weights[np.newaxis, :].astype(np.float32)) @ self.tfidf_matrix[idx]
+        norm = np.sqrt(query.multiply(query).sum())
+        if norm > 0:
+            query = query / norm
+        cosine_sim = self._similarities(query).ravel()
+        
+        anime_indices = top_k_indices(cosine_sim, top_n, exclude=idx)
+        rec_ids = self.anime_df['anime_id'].values[anime_indices]
+        return dict(zip(rec_ids, cosine_sim[anime_indices]))
+        
+    def get_recommendations_batch(self, anime_ids, top_n=20):
+        """Batched get_recommendations: one sparse product for all seeds.
+        
+        Returns (found, rec_ids, scores): `found` masks the seeds this engine knows,
+        rec_ids/scores are (n_found, top_n) arrays, best first.
+        """
+        idx = np.array([self.anime_id_to_idx.get(aid, -1) for aid in anime_ids], dtype=np.intp)
+        found = idx >= 0
+        idx = idx[found]
+        
+        cosine_sim = self._similarities(self.tfidf_matrix[idx])
+        top = top_k_rows(cosine_sim, top_n, exclude=idx)
+        return found, self.anime_df['anime_id'].values[top], np.take_along_axis(cosine_sim, top, axis=1)
 
 
-class CollaborativeRecommender:
-    def __init__(self, ratings_df):
+def _count_terms(docs):
+    """Process-pool worker: term counts of one chunk of documents, as (sorted terms, CSR counts)."""
+    vectorizer = CountVectorizer(stop_words='english', dtype=np.float32)
+    try:
+        counts = vectorizer.fit_transform(docs)
+    except ValueError:
+        # No terms at all in this chunk (e.g. only stop words)
+        return np.array([], dtype=str), csr_matrix((len(docs), 0), dtype=np.float32)
+    return vectorizer.get_feature_names_out(), counts.tocsr()
+
+
+class ItemFactorRecommender:
+    """Item-item queries shared by the collaborative engines.
+    
+    Subclasses fit `item_factors` (one normalized row per anime, so that the dot
+    product of two rows is their similarity) and `anime_ids` (the anime of each
+    row). STATE lists the other fitted arrays that are saved with the model.
+    """
+    STATE = []
+    
+    def _build_id_maps(self):
+        # tolist(): iterating a memory-mapped array element by element is slow
+        anime_ids = self.anime_ids.tolist()
+        self.anime_id_to_idx = {id_: i for i, id_ in enumerate(anime_ids)}
+        self.idx_to_anime_id = dict(enumerate(anime_ids))
+        
+    def _profile_query(self, query):
+        norm = np.linalg.norm(query)
+        return query / norm if norm > 0 else query
+        
+    def build_ann_index(self, kind='ivf', **params):
+        """Indexes the normalized item factors; get_recommendations then searches it."""
+        self.ann_index = build_index(self.item_factors, kind, **params)
+        
+    def memory_components(self):
+        return {
+            'factors': self.item_factors,
+            'state': [getattr(self, name, None) for name in self.STATE] + [self.anime_ids],
+            'interactions': getattr(self, 'interactions', None),
+            'ann': self.ann_index,
+            'id_maps': [getattr(self, 'anime_id_to_idx', None), getattr(self, 'idx_to_anime_id', None)],
+            'ratings_df': self.ratings_df,
+        }
+        
+    def _rating_counts(self, valid_only):
+        # (ratings, users, anime) of the training data, for estimate_bytes()
+        ratings = self.ratings_df[self.ratings_df['rating'] > 0] if valid_only else self.ratings_df
+        return len(ratings), ratings['user_id'].nunique(), ratings['anime_id'].nunique()
+        
+    def get_recommendations(self, anime_id, top_n=20):
+        if anime_id not in self.anime_id_to_idx:
+            return {}
+        
+        idx = self.anime_id_to_idx[anime_id]
+        
+        if self.ann_index is not None:
+            # Scores of the returned items are exact similarities (the index stores the same factors)
+            top_indices, scores = self.ann_index.search(self.item_factors[idx], top_n, exclude=idx)
+            return dict(zip(self.anime_ids[top_indices], scores.astype(np.float64)))
+        
+        # Similarity vector for this anime (one mat-vec over the normalized factors)
+        corr_vector = self.item_factors @ self.item_factors[idx]
+        
+        # Top N (excluding self)
+        top_indices = top_k_indices(corr_vector, top_n, exclude=idx)
+        
+        rec_ids = self.anime_ids[top_indices]
+        return dict(zip(rec_ids, corr_vector[top_indices]))
+        
+    def get_profile_recommendations(self, anime_ids, seed_weights=None, top_n=20):
+        """Similarity of every item with the (weighted) mean factors of several anime (see ContentRecommender)."""
+        idx = np.array([self.anime_id_to_idx.get(aid, -1) for aid in anime_ids], dtype=np.intp)
+        seed_weights = np.ones(len(idx)) if seed_weights is None else np.asarray(seed_weights, dtype=np.float64)
+        found = idx >= 0
+        idx, seed_weights = idx[found], seed_weights[found]
+        if not len(idx):
+            return {}
+        
+        # Normalize the profile vector like the item factors (see _profile_query)
+        query = self._profile_query(seed_weights @ self.item_factors[idx])
+        corr_vector = self.item_factors @ query
+        
+        top_indices = top_k_indices(corr_vector, top_n, exclude=idx)
+        rec_ids = self.anime_ids[top_indices]
+        return dict(zip(rec_ids, corr_vector[top_indices]))
+        
+    def get_recommendations_batch(self, anime_ids, top_n=20):
+        """Batched get_recommendations: one dense factor product for all seeds (see ContentRecommender)."""
+        idx = np.array([self.anime_id_to_idx.get(aid, -1) for aid in anime_ids], dtype=np.intp)
+        found = idx >= 0
+        idx = idx[found]
+        
+        corr = self.item_factors[idx] @ self.item_factors.T
+        top = top_k_rows(corr, top_n, exclude=idx)
+        return found, self.anime_ids[top], np.take_along_axis(corr, top, axis=1)
+
+
+class CollaborativeRecommender(ItemFactorRecommender):
+    # SVD state kept to fold in new ratings (partial_fit)
+    STATE = ['item_matrix', 'components', 'singular_values', 'user_ids']
+    
+    def __init__(self, ratings_df, n_components=12, n_iter=5, dtype=np.float64):
         self.ratings_df = ratings_df
+        self.n_components = n_components
+        self.n_iter = n_iter
+        # Storage type of the fitted factors (float32 halves them; the SVD itself runs in float64)
+        self.dtype = dtype
         self.algo = None
         self.pivoted_ratings = None
-        self.corr_matrix = None
+        self.item_factors = None
+        self.ann_index = None
         
     def fit(self):
         print("Training Collaborative Recommender...")
-        # Pivot Table: Users x Anime
-        # Warning: This can be huge. We use SVD on sparse matrix if possible, 
-        # but for simplicity and "Item-Item" finding, we can use a Pivot + Correlation or SVD.
-        
         # Let's use Truncated SVD for dimensionality reduction
-        # Create Sparse Matrix from User-Item ratings
-        user_item_matrix = self.ratings_df.pivot_table(index='user_id', columns='anime_id', values='rating').fillna(0)
+        # Build the Item-User matrix directly in sparse form from categorical codes,
+        # so the dense users x anime pivot never exists (memory grows with #ratings)
+        with tracer.span('collab.matrix') as span:
+            ratings = self.ratings_df.dropna(subset=['rating'])
+            # Watched-but-unscored rows (rating 0, see ImplicitRecommender) are not scores
+            ratings = ratings[ratings['rating'] > 0]
+            item_codes = pd.Categorical(ratings['anime_id'])
+            user_codes = pd.Categorical(ratings['user_id'])
+            shape = (len(item_codes.categories), len(user_codes.categories))
+            rows, cols = item_codes.codes, user_codes.codes
+            
+            # Duplicate (user, anime) pairs are averaged, same as pivot_table did
+            item_user_matrix = csr_matrix((ratings['rating'].to_numpy(dtype=np.float64), (rows, cols)), shape=shape)
+            rating_counts = csr_matrix((np.ones(len(rows)), (rows, cols)), shape=shape)
+            item_user_matrix.data /= rating_counts.data
+            span.count = item_user_matrix.nnz
         
-        # Transpose to Item-User for Item-Item similarity
-        item_user_matrix = user_item_matrix.T
+        # SVD (accepts sparse input directly)
+        with tracer.span('collab.svd', count=shape[0]):
+            SVD = TruncatedSVD(n_components=self.n_components, n_iter=self.n_iter, random_state=42)
+            self.item_matrix = SVD.fit_transform(item_user_matrix)
+        # Kept to fold in new ratings later (partial_fit): item_matrix = X @ components.T
+        self.item_matrix = self.item_matrix.astype(self.dtype, copy=False)
+        self.components = SVD.components_.astype(self.dtype, copy=False)
+        self.singular_values = SVD.singular_values_
+        self.user_ids = user_codes.categories.to_numpy()
+        with tracer.span('collab.normalize', count=shape[0]):
+            self.item_factors = self._normalize(self.item_matrix)
         
-        # SVD
-        SVD = TruncatedSVD(n_components=12, random_state=42)
-        matrix = SVD.fit_transform(item_user_matrix)
+        # Map anime_id to matrix index
+        self.anime_ids = item_codes.categories.to_numpy()
+        self._build_id_maps()
         
-        # Compute Correlation Matrix (Item-Item)
-        self.corr_matrix = np.corrcoef(matrix)
+        print("Collaborative Recommender Trained.")
         
-        # Map anime_id to matrix index
-        self.anime_id_to_idx = {id_: i for i, id_ in enumerate(item_user_matrix.index)}
-        self.idx_to_anime_id = {i: id_ for i, id_ in enumerate(item_user_matrix.index)}
+    def fit_streaming(self, rating_blocks, anime_ids=None, min_user_ratings=10, oversample=10,
+                      block_rows=1_000_000, memory_budget_mb=512, seed=42):
+        """Out-of-core fit(): randomized SVD over ratings streamed from disk.
+        
+        `rating_blocks()` must return a new iterator of (user_ids, anime_ids, scores)
+        arrays (valid ratings) on every call; the data is read n_iter + 3 times (counts,
+        range finding, n_iter power iterations, projection). Only ratings of
+        `anime_ids` (if given) from users with >= `min_user_ratings` of them are used,
+        like the data loader's filter. Memory is the dense (users + anime) x
+        (n_components + oversample) factors plus one block of `block_rows` ratings,
+        never the rating matrix. Duplicate (user, anime) pairs are summed, not averaged.
+        """
+        print("Training Collaborative Recommender (streaming randomized SVD)...")
+        rank = self.n_components + oversample
+        
+        # 1. Pass 1: ratings per user (known anime only), to index the kept users
+        known = None
+        if anime_ids is not None:
+            known = np.zeros(int(np.max(anime_ids)) + 1, dtype=bool)
+            known[anime_ids] = True
+        
+        def blocks():
+            for users, items, scores in rating_blocks():
+                for start in range(0, len(users), block_rows):
+                    block_users, block_items = users[start:start + block_rows], items[start:start + block_rows]
+                    block_scores = scores[start:start + block_rows].astype(np.float64)
+                    if known is not None:
+                        keep = block_items < len(known)
+                        keep[keep] = known[block_items[keep]]
+                        block_users, block_items, block_scores = block_users[keep], block_items[keep], block_scores[keep]
+                    yield block_users, block_items, block_scores
+        
+        user_counts, n_item_slots = np.zeros(0, dtype=np.int64), 0
+        with tracer.span('collab.stream_counts') as span:
+            for users, items, _ in blocks():
+                chunk_counts = np.bincount(users)
+                if len(chunk_counts) > len(user_counts):
+                    user_counts = np.pad(user_counts, (0, len(chunk_counts) - len(user_counts)))
+                user_counts[:len(chunk_counts)] += chunk_counts
+                n_item_slots = max(n_item_slots, int(items.max()) + 1 if len(items) else 0)
+            span.count = int(user_counts.sum())
+        user_ids = np.flatnonzero(user_counts >= min_user_ratings)
+        user_index = np.full(len(user_counts), -1, dtype=np.int64)
+        user_index[user_ids] = np.arange(len(user_ids))
+        n_users = len(user_ids)
+        
+        needed_mb = ((2 * n_users + 3 * n_item_slots) * rank * 8 + block_rows * 40) / 2**20
+        print(f"Streaming SVD: {n_users} users, {n_item_slots} anime id slots, ~{needed_mb:.0f} MB of factors")
+        if needed_mb > memory_budget_mb:
+            raise ValueError(f"Streaming SVD needs ~{needed_mb:.0f} MB > budget {memory_budget_mb} MB: "
+                             "lower n_components/oversample/block_rows or raise the budget.")
+        
+        # Rows = anime ids (unrated ids stay all-zero and are dropped at the end), columns = kept users
+        item_counts = np.zeros(n_item_slots, dtype=np.int64)
+        
+        def product(dense, transpose=False, count_items=False):
+            # X @ dense (or X.T @ dense), accumulated block by block
+            out = np.zeros((n_users if transpose else n_item_slots, dense.shape[1]))
+            with tracer.span('collab.stream_pass', count=0) as span:
+                for users, items, scores in blocks():
+                    cols = user_index[users]
+                    kept = cols >= 0
+                    rows, cols, scores = items[kept], cols[kept], scores[kept]
+                    span.count += len(rows)
+                    if count_items:
+                        item_counts[:] += np.bincount(rows, minlength=n_item_slots)
+                    if transpose:
+                        out += csr_matrix((scores, (cols, rows)), shape=(n_users, n_item_slots)) @ dense
+                    else:
+                        out += csr_matrix((scores, (rows, cols)), shape=(n_item_slots, n_users)) @ dense
+            return out
+        
+        # 2. Randomized range finder with power iterations (QR-normalized each pass)
+        rng = np.random.default_rng(seed)
+        Y = product(rng.standard_normal((n_users, rank)), count_items=True)
+        for _ in range(self.n_iter):
+            Q = np.linalg.qr(Y)[0]
+            Z = np.linalg.qr(product(Q, transpose=True))[0]
+            Y = product(Z)
+        Q = np.linalg.qr(Y)[0]
+        
+        # 3. Project onto the range (B = Q^T X, small) and take its exact SVD
+        B = product(Q, transpose=True).T
+        U_b, sigma, VT = np.linalg.svd(B, full_matrices=False)
+        U, VT = svd_flip(Q @ U_b, VT, u_based_decision=False)
+        U, sigma, VT = U[:, :self.n_components], sigma[:self.n_components], VT[:self.n_components]
+        
+        # Same state as fit(): only anime that have ratings, in anime_id order
+        rated = np.flatnonzero(item_counts)
+        self.item_matrix = (U[rated] * sigma).astype(self.dtype, copy=False)
+        self.components = VT.astype(self.dtype, copy=False)
+        self.singular_values = sigma
+        self.user_ids = user_ids
+        with tracer.span('collab.normalize', count=len(rated)):
+            self.item_factors = self._normalize(self.item_matrix)
+        self.anime_ids = rated
+        self._build_id_maps()
         
         print("Collaborative Recommender Trained.")
+        
+    @staticmethod
+    def _normalize(matrix):
+        # Item-Item correlation without the N x N matrix:
+        # center and L2-normalize each item's factors, so that the dot product of two
+        # rows equals their Pearson correlation (what np.corrcoef used to compute)
+        factors = matrix - matrix.mean(axis=1, keepdims=True)
+        norms = np.linalg.norm(factors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return factors / norms
+        
+    def _profile_query(self, query):
+        # Center and normalize the profile vector like the item factors, so scores stay correlations
+        return super()._profile_query(query - query.mean())
+        
+    def estimate_bytes(self, itemsize=None):
+        """Estimated bytes of the fitted state, and the peak extra memory of fit()."""
+        itemsize = itemsize or np.dtype(self.dtype).itemsize
+        n_ratings, n_users, n_items = self._rating_counts(valid_only=True)
+        factors = (2 * n_items * self.n_components + self.n_components * n_users) * itemsize
+        return {
+            'factors': factors + (n_users + n_items) * 8,
+            # Two CSR matrices (scores, counts) built from COO + the randomized SVD workspace
+            'fit workspace': n_ratings * 40 + (n_users + n_items) * (self.n_components + 10) * 8 * 2,
+        }
+        
+    def partial_fit(self, new_ratings_df):
+        """Folds new (user, anime, rating) entries into the fitted SVD space.
+        
+        New users are projected onto the existing components from their ratings of
+        known anime (v_u = x_u @ item_matrix / sigma^2); every new rating then adds
+        rating * v_u to its anime's SVD coordinates, and unseen anime start from
+        zero. The components themselves are not re-learned (that needs a refit), and a
+        re-rated (user, anime) pair adds to the old rating instead of replacing it.
+        Returns the anime_ids whose factors changed.
+        """
+        ratings = new_ratings_df.dropna(subset=['rating'])
+        ratings = ratings[ratings['rating'] > 0]
+        users = ratings['user_id'].to_numpy()
+        items = ratings['anime_id'].to_numpy()
+        scores = ratings['rating'].to_numpy(dtype=np.float64)
+        
+        # 1. New anime get a zero row (copies: loaded arrays may be read-only memory maps)
+        new_items = np.setdiff1d(np.unique(items), self.anime_ids)
+        self.anime_ids = np.concatenate([self.anime_ids, new_items.astype(self.anime_ids.dtype)])
+        item_matrix = np.vstack([self.item_matrix, np.zeros((len(new_items), self.item_matrix.shape[1]), dtype=self.item_matrix.dtype)])
+        self._build_id_maps()
+        item_idx = pd.Index(self.anime_ids).get_indexer(items)
+        
+        # 2. New users: fold in from their ratings of the anime already in the space
+        user_idx = pd.Index(self.user_ids).get_indexer(users)
+        is_new = user_idx < 0
+        new_users, new_rows = np.unique(users[is_new], return_inverse=True)
+        user_factors = np.zeros((len(new_users), item_matrix.shape[1]))
+        np.add.at(user_factors, new_rows, scores[is_new, np.newaxis] * item_matrix[item_idx[is_new]])
+        user_factors /= self.singular_values ** 2
+        
+        user_idx[is_new] = len(self.user_ids) + new_rows
+        self.components = np.hstack([self.components, user_factors.T.astype(self.components.dtype)])
+        self.user_ids = np.concatenate([self.user_ids, new_users.astype(self.user_ids.dtype)])
+        
+        # 3. Every new rating moves its anime along the rater's component vector
+        np.add.at(item_matrix, item_idx, scores[:, np.newaxis] * self.components[:, user_idx].T)
+        self.item_matrix = item_matrix
+        
+        changed = np.unique(item_idx)
+        item_factors = np.vstack([self.item_factors, np.zeros((len(new_items), item_matrix.shape[1]), dtype=self.item_factors.dtype)])
+        item_factors[changed] = self._normalize(item_matrix[changed])
+        self.item_factors = item_factors
+        if self.ann_index is not None:
+            self.ann_index.update(changed, item_factors[changed])
+        return self.anime_ids[changed]
 
-    def get_recommendations(self, anime_id, top_n=20):
-        if anime_id not in self.anime_id_to_idx:
-            return {}
+class ImplicitRecommender(ItemFactorRecommender):
+    """Implicit-feedback collaborative engine: ALS on who watched what (Hu, Koren & Volinsky).
+    
+    Every (user, anime) row counts as a positive interaction with confidence
+    1 + alpha, including watched-but-unscored rows (rating 0) that the explicit
+    SVD model cannot use. Items are scored by the cosine of their ALS factors.
+    """
+    STATE = ['user_factors', 'item_vectors', 'user_ids', 'interaction_indptr', 'interaction_indices']
+    
+    def __init__(self, ratings_df, factors=32, iterations=15, regularization=0.1, alpha=10.0,
+                 cg_steps=3, workers=None, block_nnz=None, seed=42, dtype=np.float64):
+        self.ratings_df = ratings_df
+        # Storage type of the fitted factors (the sweeps themselves run in float64)
+        self.dtype = dtype
+        self.factors = factors
+        self.iterations = iterations
+        self.regularization = regularization
+        self.alpha = alpha
+        self.cg_steps = cg_steps
+        # Row blocks are solved in `workers` threads (NumPy/SciPy release the GIL in BLAS/LAPACK);
+        # a block holds ~`block_nnz` interactions (block_nnz x factors floats of temporaries)
+        self.workers = workers or os.cpu_count()
+        self.block_nnz = block_nnz or max(1, (64 << 20) // (8 * 4 * factors))
+        self.seed = seed
+        self.interactions = None
+        self.item_factors = None
+        self.ann_index = None
         
-        idx = self.anime_id_to_idx[anime_id]
+    def fit(self):
+        print("Training Implicit ALS Recommender...")
+        with tracer.span('als.interactions') as span:
+            item_codes = pd.Categorical(self.ratings_df['anime_id'])
+            user_codes = pd.Categorical(self.ratings_df['user_id'])
+            self.user_ids = user_codes.categories.to_numpy()
+            self.anime_ids = item_codes.categories.to_numpy()
+            self._set_interactions(user_codes.codes, item_codes.codes, len(self.user_ids), len(self.anime_ids))
+            span.count = self.interactions.nnz
+        
+        # Small random start, then alternate: users given items, items given users
+        rng = np.random.default_rng(self.seed)
+        self.user_factors = rng.normal(scale=0.01, size=(len(self.user_ids), self.factors))
+        self.item_vectors = rng.normal(scale=0.01, size=(len(self.anime_ids), self.factors))
+        item_users = self.interactions.T.tocsr()
+        for _ in range(self.iterations):
+            with tracer.span('als.sweep', count=len(self.user_ids) + len(self.anime_ids)):
+                self.user_factors = self._solve(self.interactions, self.item_vectors, self.user_factors)
+                self.item_vectors = self._solve(item_users, self.user_factors, self.item_vectors)
+        
+        self.user_factors = self.user_factors.astype(self.dtype, copy=False)
+        self.item_vectors = self.item_vectors.astype(self.dtype, copy=False)
+        with tracer.span('als.normalize', count=len(self.anime_ids)):
+            self.item_factors = self._normalize(self.item_vectors)
+        self._build_id_maps()
+        print("Implicit ALS Recommender Trained.")
         
-        # Correlation vector for this anime
-        corr_vector = self.corr_matrix[idx]
+    def _set_interactions(self, users, items, n_users, n_items):
+        # Binary users x anime matrix (duplicates collapse to one interaction)
+        interactions = csr_matrix((np.ones(len(users), dtype=np.float32), (users, items)), shape=(n_users, n_items))
+        interactions.sum_duplicates()
+        interactions.data[:] = 1.0
+        self.interactions = interactions
+        self.interaction_indptr, self.interaction_indices = interactions.indptr, interactions.indices
         
-        # Sort indices
-        sorted_indices = np.argsort(corr_vector)[::-1]
+    @staticmethod
+    def _normalize(vectors):
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
         
-        # Top N
-        top_indices = sorted_indices[1:top_n+1]
+    def _solve(self, interactions, fixed, current=None):
+        """One ALS half-step: the least-squares factors of every row of `interactions` given `fixed`.
         
-        rec_ids = [self.idx_to_anime_id[i] for i in top_indices]
-        scores = [corr_vector[i] for i in top_indices]
+        Row u solves (F'F + alpha * F_u'F_u + reg * I) x_u = (1 + alpha) * F_u'1, where F_u
+        are the fixed factors of the row's interactions. With `current` (the previous
+        factors) each row takes `cg_steps` warm-started conjugate gradient steps, which
+        costs O(nnz * factors) instead of forming every row's factors x factors system;
+        without it the systems are solved exactly. Rows are processed in blocks, one
+        thread per block.
+        """
+        gram = fixed.T @ fixed + self.regularization * np.eye(self.factors)
+        n_rows = interactions.shape[0]
         
-        return dict(zip(rec_ids, scores))
+        # Block boundaries with ~block_nnz interactions each (at least one row)
+        starts = np.searchsorted(interactions.indptr, np.arange(0, interactions.nnz, self.block_nnz), side='right') - 1
+        bounds = np.unique(np.concatenate([[0], starts, [n_rows]]))
+        
+        def solve_block(start, end):
+            block = interactions[start:end]
+            picked = fixed[block.indices]
+            # Per-row sums over a row's interactions as one sparse (rows x interactions) product
+            rows = csr_matrix((np.ones(block.nnz), np.arange(block.nnz), block.indptr), shape=(end - start, block.nnz))
+            rhs = (1 + self.alpha) * (rows @ picked)
+            
+            if current is None or not self.cg_steps:
+                outer = (rows @ np.einsum('ni,nj->nij', picked, picked).reshape(block.nnz, -1)).reshape(-1, self.factors, self.factors)
+                return np.linalg.solve(gram + self.alpha * outer, rhs[:, :, np.newaxis])[:, :, 0]
+            
+            row_of = np.repeat(np.arange(end - start), np.diff(block.indptr))
+            
+            def matvec(p):
+                return p @ gram + self.alpha * (rows @ (picked * np.einsum('nf,nf->n', picked, p[row_of])[:, np.newaxis]))
+            
+            x = np.array(current[start:end])
+            residual = rhs - matvec(x)
+            direction = residual.copy()
+            rs = np.einsum('nf,nf->n', residual, residual)
+            for _ in range(self.cg_steps):
+                product = matvec(direction)
+                step = np.divide(rs, np.einsum('nf,nf->n', direction, product), out=np.zeros_like(rs), where=rs > 1e-20)
+                x += step[:, np.newaxis] * direction
+                residual -= step[:, np.newaxis] * product
+                rs_new = np.einsum('nf,nf->n', residual, residual)
+                direction = residual + np.divide(rs_new, rs, out=np.zeros_like(rs), where=rs > 1e-20)[:, np.newaxis] * direction
+                rs = rs_new
+            return x
+        
+        with ThreadPoolExecutor(self.workers) as pool:
+            parts = list(pool.map(solve_block, bounds[:-1], bounds[1:]))
+        return np.vstack(parts) if parts else np.zeros((0, self.factors))
+        
+    def partial_fit(self, new_ratings_df):
+        """Adds new interactions and re-solves only the users and anime they touch.
+        
+        New users/anime get rows; each affected user is solved given the current item
+        factors, then each affected anime given the updated user factors (one exact ALS
+        half-step each, no full sweep). Returns the anime_ids whose factors changed.
+        """
+        users = new_ratings_df['user_id'].to_numpy()
+        items = new_ratings_df['anime_id'].to_numpy()
+        
+        # 1. New users / anime get zero rows (copies: loaded arrays may be read-only memory maps)
+        new_users = np.setdiff1d(np.unique(users), self.user_ids)
+        new_items = np.setdiff1d(np.unique(items), self.anime_ids)
+        self.user_ids = np.concatenate([self.user_ids, new_users.astype(self.user_ids.dtype)])
+        self.anime_ids = np.concatenate([self.anime_ids, new_items.astype(self.anime_ids.dtype)])
+        user_factors = np.vstack([self.user_factors, np.zeros((len(new_users), self.factors), dtype=self.user_factors.dtype)])
+        item_vectors = np.vstack([self.item_vectors, np.zeros((len(new_items), self.factors), dtype=self.item_vectors.dtype)])
+        self._build_id_maps()
+        
+        # 2. Old + new interactions
+        user_idx = pd.Index(self.user_ids).get_indexer(users)
+        item_idx = pd.Index(self.anime_ids).get_indexer(items)
+        old = self._interaction_matrix().tocoo()
+        self._set_interactions(np.concatenate([old.row, user_idx]), np.concatenate([old.col, item_idx]),
+                               len(self.user_ids), len(self.anime_ids))
+        
+        # 3. Re-solve the touched users, then the touched anime
+        changed_users, changed_items = np.unique(user_idx), np.unique(item_idx)
+        user_factors[changed_users] = self._solve(self.interactions[changed_users], item_vectors)
+        item_vectors[changed_items] = self._solve(self.interactions.T.tocsr()[changed_items], user_factors)
+        self.user_factors, self.item_vectors = user_factors, item_vectors
+        
+        item_factors = np.vstack([self.item_factors, np.zeros((len(new_items), self.factors), dtype=self.item_factors.dtype)])
+        item_factors[changed_items] = self._normalize(item_vectors[changed_items])
+        self.item_factors = item_factors
+        if self.ann_index is not None:
+            self.ann_index.update(changed_items, item_factors[changed_items])
+        return self.anime_ids[changed_items]
+        
+    def estimate_bytes(self, itemsize=None):
+        """Estimated bytes of the fitted state, and the peak extra memory of fit()."""
+        itemsize = itemsize or np.dtype(self.dtype).itemsize
+        n_ratings, n_users, n_items = self._rating_counts(valid_only=False)
+        block_nnz = min(self.block_nnz, n_ratings)
+        blocks = min(self.workers, -(-n_ratings // max(block_nnz, 1)))
+        return {
+            'factors': (n_users + 2 * n_items) * self.factors * itemsize + n_ratings * 8 + (n_users + n_items) * 8,
+            # COO -> CSR + its transpose, float64 factors during the sweeps, the blocks solved at once
+            'fit workspace': n_ratings * 24 + (n_users + n_items) * self.factors * 8 * 2 + blocks * block_nnz * self.factors * 8 * 4,
+        }
+        
+    def _interaction_matrix(self):
+        # Rebuilt from the saved CSR parts after HybridRecommender.load()
+        if self.interactions is None:
+            self.interactions = csr_matrix(
+                (np.ones(len(self.interaction_indices), dtype=np.float32), self.interaction_indices, self.interaction_indptr),
+                shape=(len(self.interaction_indptr) - 1, len(self.item_vectors))
+            )
+        return self.interactions
 
 
 class HybridRecommender:
-    def __init__(self, anime_df, ratings_df):
+    # Bump when the saved artifact layout changes (old artifacts are then ignored)
+    ARTIFACT_VERSION = 6
+    DEFAULT_PARAMS = {
+        'max_features': 5000, 'min_df': 3, 'n_components': 12, 'n_iter': 5,
+        # Collaborative engine: 'svd' (explicit scores) or 'als' (implicit feedback, ImplicitRecommender)
+        'collab_model': 'svd', 'als_factors': 32, 'als_iterations': 15, 'als_regularization': 0.1, 'als_alpha': 10.0,
+        # Storage type of the collaborative factors ('float32' halves them)
+        'dtype': 'float64',
+        # Memory budget (MB) of the fitted model; fit() picks cheaper settings or fails fast (None = no limit)
+        'model_budget_mb': None,
+    }
+    # Smallest TF-IDF vocabulary the memory planner falls back to
+    MIN_FEATURES = 500
+    # Candidates taken from each engine before merging
+    CANDIDATES = 50
+    # anime_df columns kept in the artifact (the TF-IDF 'soup' is only needed to fit)
+    META_COLUMNS = ['anime_id', 'name', 'english_name', 'genre', 'type', 'rating', 'episodes', 'synopsis', 'image_url']
+    
+    def __init__(self, anime_df, ratings_df, cache_size=1024, cache_ttl=3600, **params):
         self.anime_df = anime_df
-        self.content_engine = ContentRecommender(anime_df)
-        self.collab_engine = CollaborativeRecommender(ratings_df)
+        self.params = {**self.DEFAULT_PARAMS, **params}
+        self.content_engine = ContentRecommender(anime_df, max_features=self.params['max_features'], min_df=self.params['min_df'])
+        dtype = np.dtype(self.params['dtype'])
+        if self.params['collab_model'] == 'als':
+            self.collab_engine = ImplicitRecommender(
+                ratings_df, factors=self.params['als_factors'], iterations=self.params['als_iterations'],
+                regularization=self.params['als_regularization'], alpha=self.params['als_alpha'], dtype=dtype
+            )
+        else:
+            self.collab_engine = CollaborativeRecommender(ratings_df, n_components=self.params['n_components'],
+                                                          n_iter=self.params['n_iter'], dtype=dtype)
+        self.rec_table = None
+        # Settings chosen by fit() under model_budget_mb (None without a budget)
+        self.memory_plan = None
+        # ANN settings once enable_ann() was called (None = exact scans)
+        self.ann = None
         
-    def fit(self):
-        self.content_engine.fit()
-        self.collab_engine.fit()
+        # Result cache for recommend() (cache_size=0 disables it); entries are tied to
+        # `model_key` (the artifact key, or a fresh id per fit) and dropped when it changes
+        self.result_cache = ResultCache(maxsize=cache_size, ttl=cache_ttl) if cache_size else None
+        self.model_key = None
+        
+    def fit(self, rating_blocks=None, parallel=True, **stream_options):
+        """Fits both engines. With `rating_blocks` (see CollaborativeRecommender.fit_streaming)
+        the collaborative model streams the ratings from disk instead of using ratings_df.
+        
+        The engines are independent, so with `parallel` they are fitted concurrently in
+        two threads: the content engine tokenizes (in processes when the catalogue is
+        large) while the collaborative engine spends its time in BLAS, which releases
+        the GIL. Wall time is then about that of the slower engine.
+        """
+        if rating_blocks is not None:
+            if not isinstance(self.collab_engine, CollaborativeRecommender):
+                raise ValueError("Streaming training is only supported by the 'svd' collaborative model.")
+            anime_ids = self.anime_df['anime_id'].to_numpy()
+            fit_collab = lambda: self.collab_engine.fit_streaming(rating_blocks, anime_ids=anime_ids, **stream_options)
+        else:
+            fit_collab = self.collab_engine.fit
+        if self.params['model_budget_mb'] is not None:
+            self._plan_memory(streaming=rating_blocks is not None)
+        
+        with tracer.trace('fit', count=len(self.anime_df)):
+            if parallel:
+                with ThreadPoolExecutor(2) as pool:
+                    # wrap(): the engines' spans stay children of this fit in the pool threads
+                    fits = [pool.submit(tracer.wrap(self.content_engine.fit)), pool.submit(tracer.wrap(fit_collab))]
+                    for future in fits:
+                        future.result()
+            else:
+                self.content_engine.fit()
+                fit_collab()
+            with tracer.span('fit.lookups', count=len(self.anime_df)):
+                self._build_lookups()
+        self.model_key = uuid.uuid4().hex
+        if self.params['model_budget_mb'] is not None:
+            # The ratings were only needed to fit (update() folds in new ones without them)
+            self.collab_engine.ratings_df = None
+            resident = sum(r for r, _ in self.memory_usage().values())
+            print(f"Model memory: {resident / 2**20:.1f} MB of {self.params['model_budget_mb']} MB budget.")
+        
+    def _plan_memory(self, streaming=False):
+        """Picks the cheapest settings needed to fit the model within model_budget_mb.
+        
+        Tries, in order: the configured settings, float32 collaborative factors,
+        then halving max_features (down to MIN_FEATURES). The estimate covers the
+        fitted arrays plus the transient fit memory (soup, rating matrices, SVD/ALS
+        workspace); the metadata in anime_df is measured. Raises ValueError with
+        the breakdown when even the cheapest setting does not fit.
+        """
+        budget = self.params['model_budget_mb'] * 2**20
+        content, collab = self.content_engine, self.collab_engine
+        fixed = sum(r for r, _ in measure({'anime_df': self.anime_df}).values())
+        
+        def estimate(max_features, dtype):
+            parts = {'anime_df': fixed}
+            parts.update(content.estimate_bytes(max_features))
+            # Streaming training sizes itself from the raw file (its memory_budget_mb), not from ratings_df
+            if not streaming:
+                parts.update({f"collab {name}": size for name, size in collab.estimate_bytes(np.dtype(dtype).itemsize).items()})
+            return parts
+        
+        candidates = [(content.max_features, collab.dtype), (content.max_features, np.float32)]
+        max_features = content.max_features // 2
+        while max_features >= self.MIN_FEATURES:
+            candidates.append((max_features, np.float32))
+            max_features //= 2
+        
+        for max_features, dtype in candidates:
+            parts = estimate(max_features, dtype)
+            if sum(parts.values()) <= budget:
+                break
+        else:
+            breakdown = ', '.join(f"{name} {size / 2**20:.1f} MB" for name, size in parts.items())
+            raise ValueError(
+                f"The model does not fit in model_budget_mb={self.params['model_budget_mb']}: even with "
+                f"max_features={max_features} and float32 factors it needs ~{sum(parts.values()) / 2**20:.0f} MB "
+                f"({breakdown}). Raise the budget or reduce the data (e.g. a higher min_user_ratings)."
+            )
+        
+        content.max_features = max_features
+        collab.dtype = np.dtype(dtype)
+        self.params.update(max_features=max_features, dtype=collab.dtype.name)
+        self.memory_plan = {'max_features': max_features, 'dtype': collab.dtype.name,
+                            'estimated_mb': round(sum(parts.values()) / 2**20, 1)}
+        print(f"Memory plan: max_features={max_features}, {collab.dtype.name} factors, "
+              f"~{self.memory_plan['estimated_mb']} MB of {self.params['model_budget_mb']} MB.")
+        
+    def memory_usage(self):
+        """{component: (resident_bytes, mapped_bytes)} of everything the model holds.
+        
+        Memory-mapped arrays (a loaded artifact) are reported as mapped: they are
+        shared by every process serving the same artifact.
+        """
+        components = {f"content.{name}": obj for name, obj in self.content_engine.memory_components().items()}
+        components.update({f"collab.{name}": obj for name, obj in self.collab_engine.memory_components().items()})
+        components.update({
+            'anime_df': self.anime_df,
+            'lookups': [getattr(self, name, None) for name in
+                        ['meta', 'rating_values', 'sorted_anime_ids', 'sorted_positions', 'title_words', 'title_word_counts']],
+            'title_index': getattr(self, 'title_index', None),
+            'rec_table': self.rec_table,
+            'result_cache': self.result_cache,
+        })
+        return measure(components)
+        
+    def memory_report(self):
+        return format_report(self.memory_usage())
+        
+    def _check_budget(self, extra_bytes, what):
+        # Fail before allocating a structure that would take the model over model_budget_mb
+        if self.params['model_budget_mb'] is None:
+            return
+        budget = self.params['model_budget_mb'] * 2**20
+        resident = sum(r for r, _ in self.memory_usage().values())
+        if resident + extra_bytes > budget:
+            raise ValueError(
+                f"{what} needs ~{extra_bytes / 2**20:.1f} MB but the model already holds {resident / 2**20:.1f} MB "
+                f"of model_budget_mb={self.params['model_budget_mb']}. Use a smaller k or raise the budget."
+            )
+        
+    def precompute_neighbors(self, k=50):
+        """Precomputes the top-k content neighbors of every anime (see ContentRecommender)."""
+        n_items = len(self.anime_df)
+        self._check_budget(n_items * min(k, n_items - 1) * 8, f"Top-{k} content neighbor table")
+        self.content_engine.precompute_neighbors(k)
+        
+    def enable_ann(self, kind='ivf', content_dims=128, rerank=4, **params):
+        """Serves single-anime queries through approximate nearest-neighbor indexes.
+        
+        Builds one index over the collaborative item factors and one over a
+        `content_dims`-dim embedding of the TF-IDF rows. `params` go to both indexes
+        (for IVF: n_lists, n_probe - the recall/latency knob); `rerank` only to the
+        content engine (candidates re-scored with the exact cosine). Profile queries,
+        batches and the recommendation table keep using exact scans.
+        """
+        n_items = len(self.anime_df)
+        # Embedding + the rows copied into the index lists, for both engines (float32)
+        self._check_budget(n_items * (content_dims + self.collab_engine.item_factors.shape[1]) * 4 * 2, "ANN indexes")
+        self.content_engine.build_ann_index(kind, n_components=content_dims, rerank=rerank, **params)
+        self.collab_engine.build_ann_index(kind, **params)
+        self.ann = {'kind': kind, 'content_dims': content_dims, 'rerank': rerank, **params}
+        if self.result_cache is not None:
+            self.result_cache.clear()
+        
+    def save(self, path):
+        """Writes the fitted model as flat arrays (+ metadata) into directory `path`."""
+        os.makedirs(path, exist_ok=True)
+        
+        # Metadata table (mixed object columns, e.g. rating after fillna(0), are stored as text), as an
+        # uncompressed Arrow file: load() memory-maps it, so its strings are shared instead of copied
+        meta_df = self.anime_df[[col for col in self.META_COLUMNS if col in self.anime_df]].reset_index(drop=True)
+        for col in meta_df.columns:
+            values = meta_df[col]
+            if values.dtype == object and not values.map(lambda v: isinstance(v, str) or pd.isna(v)).all():
+                # Nulls stay nulls (astype(str) would store them as 'None' / 'nan')
+                meta_df[col] = values.where(values.isna(), values.astype(str))
+        feather.write_feather(meta_df, os.path.join(path, 'anime.arrow'), compression='uncompressed')
+        
+        # Content engine: TF-IDF CSR components
+        tfidf = self.content_engine.tfidf_matrix.tocsr()
+        np.save(os.path.join(path, 'tfidf_data.npy'), tfidf.data)
+        np.save(os.path.join(path, 'tfidf_indices.npy'), tfidf.indices)
+        np.save(os.path.join(path, 'tfidf_indptr.npy'), tfidf.indptr)
+        # Fitted vocabulary + IDF weights, to vectorize anime added later (update())
+        with open(os.path.join(path, 'tfidf_vectorizer.pkl'), 'wb') as f:
+            pickle.dump(self.content_engine.vectorizer, f, protocol=pickle.HIGHEST_PROTOCOL)
+        if self.content_engine.neighbor_positions is not None:
+            np.save(os.path.join(path, 'content_neighbor_positions.npy'), self.content_engine.neighbor_positions)
+            np.save(os.path.join(path, 'content_neighbor_scores.npy'), self.content_engine.neighbor_scores)
+        
+        # Collaborative engine: normalized SVD item factors + their anime ids
+        np.save(os.path.join(path, 'item_factors.npy'), self.collab_engine.item_factors)
+        np.save(os.path.join(path, 'collab_anime_ids.npy'), self.collab_engine.anime_ids)
+        # ... and the engine state needed to fold in new ratings (update())
+        for name in self.collab_engine.STATE:
+            np.save(os.path.join(path, f'collab_{name}.npy'), getattr(self.collab_engine, name))
+        
+        # Title search index and sequel-filter title words as flat arrays (no rebuild at load)
+        self.title_index.save(path)
+        np.save(os.path.join(path, 'title_words_indices.npy'), self.title_words.indices)
+        np.save(os.path.join(path, 'title_words_indptr.npy'), self.title_words.indptr)
+        
+        if self.rec_table is not None:
+            self.rec_table.save(path)
+        
+        # ANN indexes (if enabled): their arrays, prefixed by engine
+        if self.ann is not None:
+            for engine_name, engine in [('content', self.content_engine), ('collab', self.collab_engine)]:
+                for name, arr in engine.ann_index.arrays().items():
+                    np.save(os.path.join(path, f'ann_{engine_name}_{name}.npy'), arr)
+            np.save(os.path.join(path, 'content_lsa_components.npy'), self.content_engine.lsa_components)
+        
+        # Manifest last: a directory without it is an incomplete artifact
+        with open(os.path.join(path, 'manifest.json'), 'w') as f:
+            json.dump({
+                'version': self.ARTIFACT_VERSION,
+                'params': self.params,
+                'tfidf_shape': list(tfidf.shape),
+                'title_words_shape': list(self.title_words.shape),
+                'ann': self.ann,
+                'memory_plan': self.memory_plan,
+            }, f, indent=2)
+        
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        """Loads a model written by save(). Arrays are memory-mapped (read-only) by default."""
+        with open(os.path.join(path, 'manifest.json')) as f:
+            manifest = json.load(f)
+        if manifest['version'] != cls.ARTIFACT_VERSION:
+            raise ValueError(f"Model artifact version {manifest['version']} != {cls.ARTIFACT_VERSION}: rebuild the model.")
+        
+        def array(name):
+            return np.load(os.path.join(path, name), mmap_mode=mmap_mode)
+        
+        # Text columns stay Arrow strings backed by the mapped file (zero-copy)
+        table = pa.ipc.open_file(pa.memory_map(os.path.join(path, 'anime.arrow'), 'r')).read_all()
+        anime_df = table.to_pandas(types_mapper=lambda t: pd.ArrowDtype(t) if pa.types.is_string(t) or pa.types.is_large_string(t) else None)
+        model = cls(anime_df, None, **manifest['params'])
+        model.model_key = os.path.basename(os.path.normpath(path))
+        model.memory_plan = manifest.get('memory_plan')
+        
+        content = model.content_engine
+        content.tfidf_matrix = csr_matrix(
+            (array('tfidf_data.npy'), array('tfidf_indices.npy'), array('tfidf_indptr.npy')),
+            shape=tuple(manifest['tfidf_shape']), copy=False
+        )
+        with open(os.path.join(path, 'tfidf_vectorizer.pkl'), 'rb') as f:
+            content.vectorizer = pickle.load(f)
+        if os.path.exists(os.path.join(path, 'content_neighbor_positions.npy')):
+            content.neighbor_positions = array('content_neighbor_positions.npy')
+            content.neighbor_scores = array('content_neighbor_scores.npy')
+        content._build_id_maps()
+        
+        collab = model.collab_engine
+        collab.item_factors = array('item_factors.npy')
+        collab.anime_ids = array('collab_anime_ids.npy')
+        for name in collab.STATE:
+            setattr(collab, name, array(f'collab_{name}.npy'))
+        collab._build_id_maps()
+        
+        indices = array('title_words_indices.npy')
+        title_words = csr_matrix((np.ones(len(indices), dtype=np.int64), indices, array('title_words_indptr.npy')),
+                                 shape=tuple(manifest['title_words_shape']), copy=False)
+        model._build_lookups(TitleIndex.load(path, mmap_mode=mmap_mode), title_words)
+        model.rec_table = RecommendationTable.load(path, mmap_mode=mmap_mode)
+        
+        ann = manifest.get('ann')
+        if ann:
+            n_probe = ann.get('n_probe', 8)
+            for prefix, engine in [('ann_content_', content), ('ann_collab_', collab)]:
+                arrays = {name[len(prefix):-4]: array(name) for name in os.listdir(path) if name.startswith(prefix)}
+                engine.ann_index = load_index(ann['kind'], arrays, n_probe=n_probe)
+            content.ann_rerank = ann.get('rerank', 4)
+            content.lsa_components = array('content_lsa_components.npy')
+            model.ann = ann
+        return model
+        
+    def _build_lookups(self, title_index=None, title_words=None):
+        # Column arrays indexed by row position, so recommend() never scans anime_df
+        self.anime_id_to_idx = self.content_engine.anime_id_to_idx
+        self.meta = {col: self._column(col) for col in ['name', 'genre', 'rating', 'episodes', 'type', 'image_url']}
+        # Numeric rating for the boost (UNKNOWN / invalid -> NaN, never boosted)
+        self.rating_values = pd.to_numeric(self.anime_df['rating'], errors='coerce').to_numpy(dtype=np.float64)
+        
+        # Title search index (exact / case-folded / substring / fuzzy), ties go to the best rated
+        if title_index is None:
+            english_names = self.anime_df['english_name'].to_numpy() if 'english_name' in self.anime_df else None
+            title_index = TitleIndex(self.meta['name'], english_names, self.rating_values)
+        self.title_index = title_index
+        
+        # Vectorized anime_id -> row position lookup (sorted ids + searchsorted)
+        anime_ids = self.anime_df['anime_id'].to_numpy()
+        first = np.sort(np.unique(anime_ids, return_index=True)[1])
+        order = np.argsort(anime_ids[first], kind='stable')
+        self.sorted_anime_ids = anime_ids[first][order]
+        self.sorted_positions = first[order]
+        
+        # Title words (4+ chars, lowercase) as a binary sparse matrix for the sequel filter
+        if title_words is None:
+            word_vectorizer = CountVectorizer(token_pattern=r'\b\w{4,}\b', binary=True)
+            title_words = word_vectorizer.fit_transform([str(name) for name in self.meta['name']]).tocsr()
+        self.title_words = title_words
+        self.title_word_counts = np.diff(self.title_words.indptr)
+        
+    def _column(self, col):
+        """anime_df column as an array indexed by row position.
+        
+        Arrow string columns (a loaded artifact) are viewed in place as a StringArray:
+        to_numpy() would copy every string into this process.
+        """
+        values = self.anime_df[col]
+        if isinstance(values.dtype, pd.ArrowDtype):
+            strings = StringArray.from_arrow(values.array.__arrow_array__())
+            if strings is not None:
+                return strings
+            # Column with nulls: NaN for them, as in a fitted model's object columns
+            return values.to_numpy(dtype=object, na_value=np.nan)
+        return values.to_numpy()
+        
+    def _positions(self, anime_ids):
+        """Row positions for an array of anime_ids (-1 where unknown)."""
+        anime_ids = np.asarray(anime_ids)
+        slots = np.searchsorted(self.sorted_anime_ids, anime_ids).clip(max=len(self.sorted_anime_ids) - 1)
+        return np.where(self.sorted_anime_ids[slots] == anime_ids, self.sorted_positions[slots], -1)
+        
+    def recommend_batch(self, anime_ids, weights={'content': 0.5, 'collab': 0.5}, top_k=3, batch_size=256):
+        """recommend() for many seed anime_ids at once.
+        
+        Returns {anime_id: results} with the same result dicts as recommend(),
+        keyed by the given ids as Python scalars (unknown seeds map to [], repeated
+        seeds are scored once).
+        """
+        anime_ids = pd.unique(np.asarray(anime_ids))
+        output = {}
+        with tracer.trace('recommend_batch', count=len(anime_ids)):
+            for start in range(0, len(anime_ids), batch_size):
+                output.update(self._recommend_batch(anime_ids[start:start + batch_size], weights, top_k))
+        return output
+        
+    def _recommend_batch(self, seeds, weights, top_k):
+        ranked = self._score_batch(seeds, weights, top_k)
+        
+        keys = seeds.tolist()
+        output = {aid: [] for aid in keys}
+        for row, pos, score in zip(ranked['rows'], ranked['positions'], ranked['scores']):
+            output[keys[row]].append(self._result(pos, score))
+        return output
+        
+    def _score_batch(self, seeds, weights, top_k):
+        """Ranked recommendations for a batch of seeds as flat arrays.
+        
+        Returns a dict of equal-length arrays sorted by (seed row, rank): rows, ranks,
+        positions (of the recommended anime), scores (hybrid) and the unweighted
+        content_scores / collab_scores they were merged from. content_floor /
+        collab_floor hold each seed's lowest candidate score per engine (see
+        RecommendationTable).
+        """
+        n_items = len(self.anime_df)
+        
+        # 1. Scores for every seed at once, as (seed row, item position, engine score) triples
+        rows, positions, engine_scores, floors = [], [], [], []
+        for engine_no, engine in enumerate([self.content_engine, self.collab_engine]):
+            found, rec_ids, rec_scores = engine.get_recommendations_batch(seeds, top_n=self.CANDIDATES)
+            floor = np.full(len(seeds), np.inf)
+            floor[found] = rec_scores.min(axis=1) if rec_scores.shape[1] == self.CANDIDATES else -np.inf
+            floors.append(floor)
+            seed_rows = np.repeat(np.flatnonzero(found), rec_ids.shape[1])
+            rec_pos = self._positions(rec_ids.ravel())
+            known = rec_pos >= 0
+            rows.append(seed_rows[known])
+            positions.append(rec_pos[known])
+            scores = np.zeros((known.sum(), 2))
+            scores[:, engine_no] = rec_scores.ravel()[known]
+            engine_scores.append(scores)
+        rows, positions, engine_scores = np.concatenate(rows), np.concatenate(positions), np.concatenate(engine_scores)
+        
+        # 2. Merge: collect both engines' scores per (seed, item), then weight them
+        keys, inverse = np.unique(rows.astype(np.int64) * n_items + positions, return_inverse=True)
+        content_scores = np.bincount(inverse, weights=engine_scores[:, 0], minlength=len(keys))
+        collab_scores = np.bincount(inverse, weights=engine_scores[:, 1], minlength=len(keys))
+        scores = (content_scores * weights['content']) + (collab_scores * weights['collab'])
+        rows, positions = keys // n_items, keys % n_items
+        
+        # 3. Boost: High Rating
+        scores[self.rating_values[positions] > 8.0] *= 1.1
+        
+        # 4. Sort per seed: best score first, ties by anime_id (same order as recommend())
+        rec_ids = self.anime_df['anime_id'].to_numpy()[positions]
+        keep = np.lexsort((rec_ids, -tie_key(scores), rows))
+        
+        # 5. Sequel/spin-off filter for the whole batch: title word overlap with the seed > 60%
+        target_pos = self._positions(seeds)[rows[keep]]
+        candidate_pos = positions[keep]
+        shared = np.asarray(self.title_words[target_pos].multiply(self.title_words[candidate_pos]).sum(axis=1)).ravel()
+        target_counts = self.title_word_counts[target_pos]
+        has_words = (target_counts > 0) & (self.title_word_counts[candidate_pos] > 0)
+        overlap = np.divide(shared, target_counts, out=np.zeros(len(shared)), where=has_words)
+        keep = keep[~(has_words & (overlap > 0.6))]
+        
+        # 6. Top K per seed (rank within each seed's group)
+        group_start = np.searchsorted(rows[keep], rows[keep], side='left')
+        ranks = np.arange(len(keep)) - group_start
+        keep, ranks = keep[ranks < top_k], ranks[ranks < top_k]
+        
+        return {
+            'rows': rows[keep], 'ranks': ranks, 'positions': positions[keep], 'scores': scores[keep],
+            'content_scores': content_scores[keep], 'collab_scores': collab_scores[keep],
+            'content_floor': floors[0], 'collab_floor': floors[1],
+        }
+        
+    def build_table(self, k=20, weights={'content': 0.5, 'collab': 0.5}, batch_size=256):
+        """Precomputes the top-k recommendations of every anime (see RecommendationTable)."""
+        print(f"Building recommendation table (top {k})...")
+        n_rows = len(self.anime_df)
+        # positions (int32) + 3 float32 score columns per entry, 2 float64 candidate floors per row
+        self._check_budget(n_rows * (k * 16 + 16), f"Top-{k} recommendation table")
+        with tracer.trace('build_table', count=n_rows):
+            ranked = self._rank_rows(np.arange(n_rows), k, weights, batch_size)
+        self.rec_table = RecommendationTable.from_ranked(n_rows, k, weights=weights, **ranked)
+        if self.result_cache is not None:
+            self.result_cache.clear()
+        
+    def _rank_rows(self, rows, k, weights, batch_size=256):
+        """_score_batch for the anime at row positions `rows` (returned as 'seeds'); 'rows' in the result are those positions."""
+        seeds = self.anime_df['anime_id'].to_numpy()
+        parts = []
+        for start in range(0, len(rows), batch_size):
+            chunk = rows[start:start + batch_size]
+            ranked = self._score_batch(seeds[chunk], weights, k)
+            ranked['rows'] = chunk[ranked['rows']]
+            ranked['seeds'] = chunk
+            parts.append(ranked)
+        return {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+        
+    def update(self, new_anime_df=None, new_ratings_df=None, batch_size=256):
+        """Folds new anime and/or ratings into the fitted model without a refit.
+        
+        New anime are vectorized with the fitted TF-IDF vocabulary, new ratings are
+        projected onto the fitted SVD components (see the engines' partial_fit).
+        Precomputed neighbors, ANN indexes and the recommendation table are only
+        updated for the affected anime. The components and vocabulary drift from a
+        full fit over time, so refit on a schedule. Returns the affected row positions.
+        """
+        affected = [np.empty(0, dtype=np.intp)]
+        old_collab = (self.collab_engine.anime_ids, self.collab_engine.item_factors)
+        with tracer.trace('update') as update_span:
+            if new_anime_df is not None:
+                new_anime_df = new_anime_df[~new_anime_df['anime_id'].isin(self.anime_df['anime_id'])]
+                if len(new_anime_df):
+                    print(f"Adding {len(new_anime_df)} anime")
+                    with tracer.span('update.content', count=len(new_anime_df)):
+                        affected.append(self.content_engine.partial_fit(new_anime_df))
+                        self.anime_df = self.content_engine.anime_df
+                        self._build_lookups()
+            
+            if new_ratings_df is not None:
+                # Same rule as the data loader: only ratings of anime with metadata
+                new_ratings_df = new_ratings_df[new_ratings_df['anime_id'].isin(self.anime_df['anime_id'])]
+                if len(new_ratings_df):
+                    print(f"Folding in {len(new_ratings_df)} ratings")
+                    # Factors before the fold-in (partial_fit replaces the arrays), see _refresh_table
+                    old_collab = (self.collab_engine.anime_ids, self.collab_engine.item_factors)
+                    with tracer.span('update.collab', count=len(new_ratings_df)):
+                        changed_ids = self.collab_engine.partial_fit(new_ratings_df)
+                    positions = self._positions(changed_ids)
+                    affected.append(positions[positions >= 0])
+            
+            affected = np.unique(np.concatenate(affected))
+            update_span.count = len(affected)
+            if self.rec_table is not None and len(affected):
+                with tracer.span('update.table', count=len(affected)):
+                    self._refresh_table(affected, old_collab, batch_size)
+        
+        self.model_key = uuid.uuid4().hex
+        return affected
+        
+    def _refresh_table(self, affected, old_collab, batch_size=256):
+        """Recomputes the table rows that the changed anime `affected` (row positions) can alter.
+        
+        A row is built from each engine's top CANDIDATES for its anime, so it can only
+        change when a changed anime enters or leaves one of those lists: its own row,
+        rows that list one of them, and rows where one of them scores at least the
+        row's candidate floor for an engine, with the new factors (it may enter) or
+        with `old_collab`, the (anime_ids, item_factors) before the update (it may have
+        been a candidate, and its score changed or it dropped out for the next one).
+        """
+        table = self.rec_table
+        n_old = len(table.positions)
+        stale = np.isin(table.positions, affected).any(axis=1)
+        
+        # Collab factor row of every anime (-1 = no ratings), before and after the update
+        content, collab = self.content_engine, self.collab_engine
+        anime_ids = self.anime_df['anime_id'].to_numpy()
+        collab_rows = pd.Index(collab.anime_ids).get_indexer(anime_ids)
+        row_factors = np.where((collab_rows[:n_old] >= 0)[:, np.newaxis], collab.item_factors[collab_rows[:n_old]], 0.0)
+        old_ids, old_item_factors = old_collab
+        versions = [(collab_rows, collab.item_factors), (pd.Index(old_ids).get_indexer(anime_ids), old_item_factors)]
+        
+        # Scores are compared with a small tolerance: the products sum in another order than at build time
+        content_floor = table.content_floor[:, np.newaxis] - 1e-6
+        collab_floor = table.collab_floor[:, np.newaxis] - 1e-6
+        for start in range(0, len(affected), batch_size):
+            chunk = affected[start:start + batch_size]
+            # Content scores only change for new anime (the vocabulary is fixed)
+            new = chunk[chunk >= n_old]
+            if len(new):
+                content_sim = (content.tfidf_matrix[:n_old] @ content.tfidf_matrix[new].T).toarray()
+                stale |= (content_sim >= content_floor).any(axis=1)
+            for factor_rows, item_factors in versions:
+                known = chunk[factor_rows[chunk] >= 0]
+                if len(known):
+                    collab_sim = row_factors @ item_factors[factor_rows[known]].T
+                    stale |= (collab_sim >= collab_floor).any(axis=1)
+        
+        rows = np.union1d(np.flatnonzero(stale), affected)
+        print(f"Updating {len(rows)} recommendation table rows")
+        ranked = self._rank_rows(rows, table.k, table.weights, batch_size)
+        self.rec_table = table.with_rows(len(self.anime_df), rows, ranked)
+        
+    def _result(self, pos, score):
+        meta = self.meta
+        return {
+            'title': meta['name'][pos],
+            'genres': meta['genre'][pos],
+            'rating': meta['rating'][pos],
+            'episodes': meta['episodes'][pos],
+            'type': meta['type'][pos],
+            'image_url': meta['image_url'][pos],
+            'score': score
+        }
         
     def recommend(self, anime_name, weights={'content': 0.5, 'collab': 0.5}, top_k=3):
+        with tracer.trace('recommend') as span:
+            results, target_name = self._recommend(anime_name, weights, top_k)
+            span.count = len(results)
+        return results, target_name
+        
+    def _recommend(self, anime_name, weights, top_k):
         # 1. Fuzzy Match / Lookup ID
-        # Simple Case-Insensitive Exact Match first
-        matches = self.anime_df[self.anime_df['name'].str.contains(anime_name, case=False, regex=False)]
+        # Exact / case-insensitive hit first, then substring and fuzzy search (best rated wins)
+        with tracer.span('recommend.title_lookup'):
+            target_pos = self.title_index.resolve(anime_name)
         
-        if matches.empty:
-            # Try splitting generic matching
+        if target_pos is None:
              return [], "Anime not found. Try a more specific name."
              
-        # Assume user meant the most popular result (most members) or exact match
-        target_anime = matches.sort_values(by='rating', ascending=False).iloc[0]
-        target_id = target_anime['anime_id']
-        target_name = target_anime['name']
+        target_id = self.anime_df['anime_id'].iat[target_pos]
+        target_name = self.meta['name'][target_pos]
         
         print(f"Generating recommendations for: {target_name} ({target_id})")
         
+        if self.result_cache is None:
+            return self._recommend_target(target_pos, weights, top_k), target_name
+        
+        # Shared result cache, keyed on the resolved anime (copies, so callers can't alter cached results)
+        cache_key = (target_id, tuple(sorted(weights.items())), top_k)
+        results = self.result_cache.get_or_compute(
+            self.model_key, cache_key, lambda: self._recommend_target(target_pos, weights, top_k)
+        )
+        return [dict(result) for result in results], target_name
+        
+    def recommend_profile(self, anime_names, user_scores=None, weights={'content': 0.5, 'collab': 0.5}, top_k=10):
+        """Recommendations for a whole watch list at the cost of a single title.
+        
+        The liked anime are folded into one content query (summed TF-IDF rows) and one
+        collaborative query (summed item factors), optionally weighted by the user's own
+        scores, and the catalogue is scored once per engine. Liked anime are never returned.
+        Returns (results, matched_names).
+        """
+        with tracer.trace('recommend_profile', count=len(anime_names)):
+            # Resolve titles (unknown ones are skipped, duplicates merged)
+            seed_weights = {}
+            with tracer.span('recommend_profile.title_lookup', count=len(anime_names)):
+                for i, name in enumerate(anime_names):
+                    pos = self.title_index.resolve(name)
+                    if pos is not None:
+                        seed_weights[pos] = seed_weights.get(pos, 0.0) + (1.0 if user_scores is None else float(user_scores[i]))
+            if not seed_weights:
+                return [], "None of these anime were found. Try more specific names."
+            
+            positions = np.fromiter(seed_weights.keys(), dtype=np.intp)
+            seed_ids = self.anime_df['anime_id'].to_numpy()[positions]
+            seed_scores = np.fromiter(seed_weights.values(), dtype=np.float64)
+            matched_names = [self.meta['name'][pos] for pos in positions]
+            
+            print(f"Generating profile recommendations for {len(positions)} anime")
+            
+            with tracer.span('recommend_profile.content') as span:
+                content_scores = self.content_engine.get_profile_recommendations(seed_ids, seed_scores, top_n=self.CANDIDATES)
+                span.count = len(content_scores)
+            with tracer.span('recommend_profile.collab') as span:
+                collab_scores = self.collab_engine.get_profile_recommendations(seed_ids, seed_scores, top_n=self.CANDIDATES)
+                span.count = len(collab_scores)
+            return self._rank(content_scores, collab_scores, weights, top_k, matched_names), matched_names
+        
+    def _recommend_target(self, target_pos, weights, top_k):
+        target_id = self.anime_df['anime_id'].iat[target_pos]
+        target_name = self.meta['name'][target_pos]
+        
+        # Default weights: served straight from the precomputed table
+        if self.rec_table is not None and self.rec_table.covers(weights, top_k):
+            with tracer.span('recommend.table', count=top_k):
+                positions, scores = self.rec_table.lookup(target_pos, top_k)
+                return [self._result(pos, np.float64(score)) for pos, score in zip(positions, scores)]
+        
         # 2. Get Scores
-        content_scores = self.content_engine.get_recommendations(target_id, top_n=50)
-        collab_scores = self.collab_engine.get_recommendations(target_id, top_n=50)
+        with tracer.span('recommend.content') as span:
+            content_scores = self.content_engine.get_recommendations(target_id, top_n=self.CANDIDATES)
+            span.count = len(content_scores)
+        with tracer.span('recommend.collab') as span:
+            collab_scores = self.collab_engine.get_recommendations(target_id, top_n=self.CANDIDATES)
+            span.count = len(collab_scores)
+        return self._rank(content_scores, collab_scores, weights, top_k, [target_name])
         
+    def _rank(self, content_scores, collab_scores, weights, top_k, target_names):
         # 3. Merge Scores
         # We need to normalize scores or just sum them if they are in same range (0-1)
         # Cosine Sim is -1 to 1 (mostly 0-1 for TF-IDF). Corr is -1 to 1. 
         
-        all_ids = set(content_scores.keys()) | set(collab_scores.keys())
-        final_scores = []
-        
-        for aid in all_ids:
-            c_score = content_scores.get(aid, 0)
-            cl_score = collab_scores.get(aid, 0)
+        with tracer.span('rank.merge') as span:
+            content_ids = np.array(list(content_scores.keys()))
+            collab_ids = np.array(list(collab_scores.keys()))
+            all_ids = np.union1d(content_ids, collab_ids)
             
             # Hybrid Score
-            final_score = (c_score * weights['content']) + (cl_score * weights['collab'])
+            final_scores = np.zeros(len(all_ids))
+            if len(content_ids):
+                final_scores[np.searchsorted(all_ids, content_ids)] += np.fromiter(content_scores.values(), dtype=np.float64) * weights['content']
+            if len(collab_ids):
+                final_scores[np.searchsorted(all_ids, collab_ids)] += np.fromiter(collab_scores.values(), dtype=np.float64) * weights['collab']
             
             # 4. Hidden Gem & Popularity Bias
-            # Get metadata
-            meta = self.anime_df[self.anime_df['anime_id'] == aid]
-            if meta.empty:
-                continue
-            meta = meta.iloc[0]
-            
-            # Boost: High Rating
-            try:
-                if float(meta['rating']) > 8.0:
-                    final_score *= 1.1
-            except (ValueError, TypeError):
-                # Skip boost if rating is UNKNOWN or invalid
-                pass
+            # Get metadata positions (skip ids without metadata)
+            positions = np.array([self.anime_id_to_idx.get(aid, -1) for aid in all_ids], dtype=np.intp)
+            known = positions >= 0
+            final_scores, positions = final_scores[known], positions[known]
+            
+            # Boost: High Rating (UNKNOWN or invalid ratings are NaN and skip the boost)
+            final_scores[self.rating_values[positions] > 8.0] *= 1.1
             
             # Penalize: Extremely Popular (if desired, to avoid "Attack on Titan" everywhere)
-            # if meta['members'] > 1_000_000:
-            #     final_score *= 0.9
-                
-            final_scores.append((aid, final_score))
+            # final_scores[members[positions] > 1_000_000] *= 0.9
             
-        # Sort
-        final_scores.sort(key=lambda x: x[1], reverse=True)
+            # Sort
+            order = np.argsort(-final_scores, kind='stable')
+            span.count = len(order)
         
-        # Get Top K details with sequel/spin-off filtering
-        results = []
-        # Extract main words from target name for filtering
+        # Get Top K with sequel/spin-off filtering
+        picked = []
+        # Extract main words from target name(s) for filtering
         import re
-        target_words = set(re.findall(r'\b\w{4,}\b', target_name.lower()))  # Words with 4+ chars
-        
-        for aid, score in final_scores:
-            if len(results) >= top_k:
-                break
-                
-            meta = self.anime_df[self.anime_df['anime_id'] == aid].iloc[0]
-            rec_name = meta['name']
-            
-            # Filter out sequels/spin-offs by checking name similarity
-            rec_words = set(re.findall(r'\b\w{4,}\b', rec_name.lower()))
+        with tracer.span('rank.sequel_filter') as span:
+            all_target_words = [set(re.findall(r'\b\w{4,}\b', name.lower())) for name in target_names]  # Words with 4+ chars
             
-            # Skip if more than 60% of target words are in the recommendation
-            if target_words and rec_words:
-                overlap = len(target_words & rec_words) / len(target_words)
-                if overlap > 0.6:
+            for i in order:
+                if len(picked) >= top_k:
+                    break
+                    
+                pos = positions[i]
+                rec_name = self.meta['name'][pos]
+                
+                # Filter out sequels/spin-offs by checking name similarity
+                rec_words = set(re.findall(r'\b\w{4,}\b', rec_name.lower()))
+                
+                # Skip if more than 60% of a target's words are in the recommendation
+                if rec_words and any(
+                    target_words and len(target_words & rec_words) / len(target_words) > 0.6
+                    for target_words in all_target_words
+                ):
                     continue
-            
-            results.append({
-                'title': rec_name,
-                'genres': meta['genre'],
-                'rating': meta['rating'],
-                'episodes': meta['episodes'],
-                'type': meta['type'],
-                'image_url': meta['image_url'],
-                'score': score
-            })
-            
-        return results, target_name
+                
+                picked.append(i)
+            span.count = len(picked)
+        
+        # 5. Metadata of the picked anime
+        with tracer.span('rank.metadata', count=len(picked)):
+            return [self._result(positions[i], final_scores[i]) for i in picked]
@@ -0,0 +1,59 @@
+import numpy as np
+
+# Scores equal to this many decimals rank as ties (broken by lower index)
+TIE_DECIMALS = 12
+
+
+def tie_key(scores):
+    """float64 copy of `scores` rounded for ranking.
+
+    The same dot product can differ in the last bits depending on the BLAS kernel
+    (batch size, memory alignment), e.g. for anime with identical factor rows:
+    rounded, such ties are ordered the same way however the scores were computed.
+    """
+    return np.round(np.asarray(scores, dtype=np.float64), TIE_DECIMALS)
+
+
+def top_k_indices(scores, k, exclude=None):
+    """Returns the indices of the k highest scores, best first.
+
+    Uses np.argpartition (O(N)) and only sorts the k selected items.
+    `exclude` is an index (or array of indices) that must never be returned.
+    """
+    scores = tie_key(scores)
+    if exclude is not None:
+        scores[exclude] = -np.inf
+        k = min(k, len(scores) - np.unique(exclude).size)
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    
+    top = np.argpartition(scores, -k)[-k:]
+    kth = scores[top].min()
+    if np.count_nonzero(scores == kth) > np.count_nonzero(scores[top] == kth):
+        # Ties cut by the k-th place: keep the lowest indices (argpartition picks arbitrary ones)
+        above = np.flatnonzero(scores > kth)
+        top = np.concatenate([above, np.flatnonzero(scores == kth)[:k - len(above)]])
+    # Sort only the selected items (ties broken by lower index for stable output)
+    return top[np.lexsort((top, -scores[top]))]
+
+
+def top_k_rows(scores, k, exclude):
+    """Row-wise top_k_indices for a 2-D score matrix, excluding column exclude[i] from row i."""
+    scores = tie_key(scores)
+    scores[np.arange(len(scores)), exclude] = -np.inf
+    k = min(k, scores.shape[1] - 1)
+    if k <= 0:
+        return np.empty((len(scores), 0), dtype=np.intp)
+    
+    top = np.argpartition(scores, -k, axis=1)[:, -k:]
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    kth = top_scores.min(axis=1, keepdims=True)
+    cut = np.flatnonzero((scores == kth).sum(axis=1) > (top_scores == kth).sum(axis=1))
+    for i in cut:
+        # Ties cut by the k-th place: keep the lowest indices, as top_k_indices
+        above = np.flatnonzero(scores[i] > kth[i])
+        top[i] = np.concatenate([above, np.flatnonzero(scores[i] == kth[i])[:k - len(above)]])
+        top_scores[i] = scores[i, top[i]]
+    # Sort only the selected items per row (ties broken by lower index, as in top_k_indices)
+    return np.take_along_axis(top, np.lexsort((top, -top_scores), axis=1), axis=1)
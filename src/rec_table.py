@@ -0,0 +1,92 @@
+import json
+import os
+
+import numpy as np
+
+
+class RecommendationTable:
+    """Precomputed top-K recommendations for every anime, for O(1) serving.
+
+    Row i holds the recommendations for the anime at row position i of anime_df,
+    as computed by HybridRecommender with `weights` (sequel filter and rating
+    boost applied). Unused slots have position -1. Content and collaborative
+    scores are kept separately next to the hybrid score.
+
+    Each row also keeps the lowest candidate score taken from each engine (its
+    CANDIDATES-th best; -inf when the engine returned fewer, +inf when it does
+    not know the anime): an anime scoring below both floors cannot enter the row,
+    which is what HybridRecommender.update() relies on to refresh only stale rows.
+    """
+
+    FILES = ['positions', 'scores', 'content_scores', 'collab_scores', 'content_floor', 'collab_floor']
+
+    def __init__(self, positions, scores, content_scores, collab_scores, content_floor, collab_floor, weights):
+        self.positions = positions
+        self.scores = scores
+        self.content_scores = content_scores
+        self.collab_scores = collab_scores
+        self.content_floor = content_floor
+        self.collab_floor = collab_floor
+        self.weights = dict(weights)
+
+    @property
+    def k(self):
+        return self.positions.shape[1]
+
+    @classmethod
+    def from_ranked(cls, n_rows, k, rows, ranks, positions, scores, content_scores, collab_scores, weights,
+                    seeds, content_floor, collab_floor):
+        """Builds the table from ranked (row, rank, item position, scores...) entries with rank < k,
+        and the candidate floors of the rows `seeds`."""
+        table = cls(
+            np.full((n_rows, k), -1, dtype=np.int32),
+            np.zeros((n_rows, k), dtype=np.float32),
+            np.zeros((n_rows, k), dtype=np.float32),
+            np.zeros((n_rows, k), dtype=np.float32),
+            # float64: compared with freshly computed scores
+            np.full(n_rows, -np.inf),
+            np.full(n_rows, -np.inf),
+            weights
+        )
+        table.positions[rows, ranks] = positions
+        table.scores[rows, ranks] = scores
+        table.content_scores[rows, ranks] = content_scores
+        table.collab_scores[rows, ranks] = collab_scores
+        table.content_floor[seeds] = content_floor
+        table.collab_floor[seeds] = collab_floor
+        return table
+
+    def with_rows(self, n_rows, rows, ranked):
+        """Copy of the table grown to `n_rows`, with `rows` replaced by new ranked entries (see from_ranked)."""
+        table = RecommendationTable.from_ranked(n_rows, self.k, weights=self.weights, **ranked)
+        kept = np.setdiff1d(np.arange(len(self.positions)), rows)
+        for name in self.FILES:
+            getattr(table, name)[kept] = getattr(self, name)[kept]
+        return table
+
+    def covers(self, weights, top_k):
+        """True if a request can be served from the table (same weights, top_k <= K)."""
+        return top_k <= self.k and dict(weights) == self.weights
+
+    def lookup(self, row, top_k):
+        """Returns (positions, scores) of the top_k recommendations for `row`."""
+        positions = self.positions[row, :top_k]
+        valid = positions >= 0
+        return positions[valid], self.scores[row, :top_k][valid]
+
+    def save(self, path):
+        for name in self.FILES:
+            np.save(os.path.join(path, f'rec_{name}.npy'), getattr(self, name))
+        with open(os.path.join(path, 'rec_table.json'), 'w') as f:
+            json.dump({'weights': self.weights, 'k': self.k}, f)
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        """Loads a saved table, or returns None if `path` has none."""
+        manifest_path = os.path.join(path, 'rec_table.json')
+        if not os.path.exists(manifest_path):
+            return None
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        arrays = {name: np.load(os.path.join(path, f'rec_{name}.npy'), mmap_mode=mmap_mode) for name in cls.FILES}
+        return cls(**arrays, weights=manifest['weights'])
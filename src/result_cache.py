@@ -0,0 +1,53 @@
+import threading
+
+from cachetools import TTLCache
+
+
+class ResultCache:
+    """Thread-safe, size-bounded LRU cache with a TTL for recommendation results.
+
+    Entries belong to one model version (`model_key`): asking with a different
+    key (e.g. after a new model artifact was loaded) drops everything cached.
+    """
+
+    def __init__(self, maxsize=1024, ttl=3600):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self.model_key = None
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, model_key, key, compute):
+        with self._lock:
+            if model_key != self.model_key:
+                self._cache.clear()
+                self.model_key = model_key
+            try:
+                value = self._cache[key]
+                self.hits += 1
+                return value
+            except KeyError:
+                self.misses += 1
+
+        # Compute outside the lock so other requests are not blocked
+        value = compute()
+        with self._lock:
+            if model_key == self.model_key:
+                self._cache[key] = value
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'size': len(self._cache),
+                'maxsize': self._cache.maxsize,
+                'ttl': self._cache.ttl,
+            }
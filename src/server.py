@@ -0,0 +1,197 @@
+import argparse
+import asyncio
+import json
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+import tornado.web
+
+from src.data_loader import DataLoader
+from src.model_store import ModelStore
+from src.models import HybridRecommender
+
+# Model of this process: loaded by _init_worker in pool processes, set directly in thread mode
+_model = None
+
+
+def _init_worker(path):
+    # Memory-mapped load: the workers share the artifact's pages through the page cache
+    global _model
+    _model = HybridRecommender.load(path)
+
+
+def _jsonable(value):
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+def _recommend(titles, weights, top_k):
+    """Pool task: recommendations for one title, or a watch-list profile for several."""
+    weights = dict(weights)
+    if len(titles) == 1:
+        results, target_name = _model.recommend(titles[0], weights=weights, top_k=top_k)
+        if not results and _model.title_index.resolve(titles[0]) is None:
+            return {'error': target_name}
+        matched = [target_name]
+    else:
+        results, matched = _model.recommend_profile(list(titles), weights=weights, top_k=top_k)
+        if isinstance(matched, str):
+            return {'error': matched}
+    return {
+        'matched': [_jsonable(name) for name in matched],
+        'results': [{key: _jsonable(value) for key, value in result.items()} for result in results],
+    }
+
+
+def _search(query, limit):
+    """Pool task: catalogue entries matching `query`, best match first."""
+    anime_ids = _model.anime_df['anime_id'].to_numpy()
+    results = []
+    for pos in _model.title_index.search(query, limit=limit):
+        result = {key: _jsonable(value) for key, value in _model._result(pos, None).items() if key != 'score'}
+        results.append({'anime_id': _jsonable(anime_ids[pos]), **result})
+    return {'results': results}
+
+
+class RecommendService:
+    """Runs pool tasks, sharing one computation between identical concurrent requests.
+
+    With `workers` > 0 the tasks run in that many processes, each with its own
+    memory-mapped copy of the artifact at `path` (no GIL contention between
+    requests); with 0 they run in threads of this process on `model`.
+    """
+
+    def __init__(self, path, workers=0, model=None):
+        global _model
+        if workers:
+            self.executor = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'),
+                                                initializer=_init_worker, initargs=(path,))
+        else:
+            _model = model if model is not None else HybridRecommender.load(path)
+            self.executor = ThreadPoolExecutor(os.cpu_count())
+        # request key -> future of the computation in progress
+        self.inflight = {}
+        self.requests = 0
+        self.coalesced = 0
+
+    async def call(self, fn, *args):
+        self.requests += 1
+        key = (fn.__name__, args)
+        future = self.inflight.get(key)
+        if future is None:
+            future = asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+            self.inflight[key] = future
+            future.add_done_callback(lambda _: self.inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        # shield(): one client going away doesn't cancel the result for the others
+        return await asyncio.shield(future)
+
+    def stats(self):
+        return {'requests': self.requests, 'coalesced': self.coalesced, 'inflight': len(self.inflight)}
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class JSONHandler(tornado.web.RequestHandler):
+    def initialize(self, service):
+        self.service = service
+
+    def write_json(self, payload, status=200):
+        self.set_status(status)
+        self.set_header('Content-Type', 'application/json; charset=UTF-8')
+        self.finish(json.dumps(payload))
+
+    def write_error(self, status_code, **kwargs):
+        self.write_json({'error': self._reason}, status_code)
+
+    def int_argument(self, name, default, low, high):
+        value = self.get_argument(name, None)
+        try:
+            value = default if value is None else int(value)
+        except ValueError:
+            raise tornado.web.HTTPError(400, reason=f"'{name}' must be an integer")
+        if not low <= value <= high:
+            raise tornado.web.HTTPError(400, reason=f"'{name}' must be between {low} and {high}")
+        return value
+
+
+class RecommendHandler(JSONHandler):
+    """GET /recommend?title=...[&title=...]&top_k=10&content=0.5&collab=0.5
+
+    One title: its recommendations; several: recommendations for the whole watch list.
+    """
+
+    async def get(self):
+        titles = tuple(title for title in self.get_arguments('title') if title.strip())
+        if not titles:
+            raise tornado.web.HTTPError(400, reason="Missing 'title'")
+        top_k = self.int_argument('top_k', 10, 1, 100)
+        try:
+            # (engine, weight) pairs: the arguments are also the coalescing key, so they must be hashable
+            weights = tuple((engine, float(self.get_argument(engine, 0.5))) for engine in ['content', 'collab'])
+        except ValueError:
+            raise tornado.web.HTTPError(400, reason="'content' and 'collab' must be numbers")
+
+        response = await self.service.call(_recommend, titles, weights, top_k)
+        self.write_json(response, 404 if 'error' in response else 200)
+
+
+class SearchHandler(JSONHandler):
+    """GET /search?q=...&limit=10: title autocomplete (exact, case-folded, substring, fuzzy)."""
+
+    async def get(self):
+        query = self.get_argument('q', '').strip()
+        if not query:
+            raise tornado.web.HTTPError(400, reason="Missing 'q'")
+        limit = self.int_argument('limit', 10, 1, 100)
+        self.write_json(await self.service.call(_search, query, limit))
+
+
+class HealthHandler(JSONHandler):
+    def get(self):
+        self.write_json({'status': 'ok', **self.service.stats()})
+
+
+def make_app(service):
+    return tornado.web.Application([
+        (r'/recommend', RecommendHandler, {'service': service}),
+        (r'/search', SearchHandler, {'service': service}),
+        (r'/health', HealthHandler, {'service': service}),
+    ])
+
+
+async def serve(service, port, address=''):
+    app = make_app(service)
+    app.listen(port, address)
+    print(f"Serving recommendations on http://{address or '0.0.0.0'}:{port}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        service.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="JSON HTTP API for the HybridRecommender (/recommend, /search).")
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--model-dir", default="models")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--address", default="")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="Scoring processes (0 = threads in the server process)")
+    args = parser.parse_args()
+
+    # Fits and saves the model on first run; the workers then memory-map the artifact
+    store = ModelStore(args.model_dir)
+    model = store.load_or_build(DataLoader(args.data_dir))
+    service = RecommendService(store.artifact_path(model.model_key), args.workers, model=model)
+    if args.workers:
+        del model
+    asyncio.run(serve(service, args.port, args.address))
@@ -0,0 +1,69 @@
+import numpy as np
+import pyarrow as pa
+
+
+class StringArray:
+    """Read-only strings stored as one UTF-8 byte buffer plus offsets.
+
+    String i is data[offsets[i]:offsets[i + 1]]. Both are flat NumPy arrays, so
+    the strings can be saved as .npy files and memory-mapped, or viewed without
+    copying over an Arrow string array (e.g. one read from a memory-mapped Arrow
+    file): every process mapping the file then shares one copy of the text.
+    """
+
+    def __init__(self, data, offsets):
+        # Plain ndarray views: slicing np.memmap objects is several times slower
+        self.data = data.view(np.ndarray)
+        self.offsets = offsets.view(np.ndarray)
+
+    @classmethod
+    def from_strings(cls, values):
+        encoded = [str(value).encode('utf-8') for value in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+        return cls(np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets)
+
+    @classmethod
+    def from_arrow(cls, array):
+        """Zero-copy view of a pyarrow (large_)string array, or None if it has nulls or several chunks."""
+        if isinstance(array, pa.ChunkedArray):
+            if array.num_chunks != 1:
+                return None
+            array = array.chunk(0)
+        if array.null_count or not (pa.types.is_string(array.type) or pa.types.is_large_string(array.type)):
+            return None
+        _, offsets, data = array.buffers()
+        offsets = np.frombuffer(offsets, dtype=np.int64 if pa.types.is_large_string(array.type) else np.int32)
+        data = np.frombuffer(data, dtype=np.uint8) if data is not None else np.empty(0, dtype=np.uint8)
+        return cls(data, offsets[array.offset:array.offset + len(array) + 1])
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, (int, np.integer)):
+            if i < 0:
+                i += len(self)
+            return self.data[self.offsets[i]:self.offsets[i + 1]].tobytes().decode('utf-8')
+        return np.array([self[j] for j in np.arange(len(self))[i]], dtype=object)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def find(self, query):
+        """Ids of the strings that contain `query` (ascending), by a vectorized scan of the buffer."""
+        needle = np.frombuffer(query.encode('utf-8'), dtype=np.uint8)
+        n = len(self.data) - len(needle) + 1
+        if not len(needle) or n <= 0:
+            return np.arange(len(self)) if not len(needle) else np.empty(0, dtype=np.intp)
+        match = self.data[:n] == needle[0]
+        for k in range(1, len(needle)):
+            match &= self.data[k:n + k] == needle[k]
+        # Byte matches in the concatenated buffer: keep those that do not cross into the next string
+        starts = np.flatnonzero(match)
+        ids = np.searchsorted(self.offsets, starts, side='right') - 1
+        return np.unique(ids[starts + len(needle) <= self.offsets[ids + 1]])
+
+    def arrays(self):
+        return {'data': self.data, 'offsets': self.offsets}
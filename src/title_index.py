@@ -0,0 +1,185 @@
+import hashlib
+import os
+
+import numpy as np
+
+from src.string_array import StringArray
+
+
+class TitleIndex:
+    """Title lookup built once at fit time.
+
+    Resolution order for a query:
+      1. Exact name (hash table hit)
+      2. Case-folded name or english name (hash table hit)
+      3. Case-insensitive substring over name + english name (trigram postings)
+      4. Fuzzy match on trigram overlap (for typos)
+    Within a step, matches are ordered by rating (best first).
+
+    Everything is stored in flat arrays (strings as StringArray, hash tables as
+    sorted hashes, postings as CSR), so a saved index is memory-mapped by
+    load() and shared by all processes serving the same artifact.
+    """
+
+    NGRAM = 3
+    FUZZY_THRESHOLD = 0.5
+    FILES = ['rank_key', 'text_rows', 'gram_counts', 'name_hashes', 'name_ids', 'text_hashes', 'text_ids',
+             'gram_codes', 'gram_offsets', 'gram_ids', 'names_data', 'names_offsets', 'texts_data', 'texts_offsets']
+
+    def __init__(self, names, english_names=None, ratings=None):
+        names = [str(n) for n in names]
+        n_rows = len(names)
+
+        # Ranking key: higher rating first, unknown ratings last
+        if ratings is None:
+            ratings = np.zeros(n_rows)
+        self.rank_key = np.nan_to_num(np.asarray(ratings, dtype=np.float64), nan=-np.inf)
+
+        # Searchable texts (name and english name), each pointing back to its row
+        texts, text_rows = [], []
+        for row, name in enumerate(names):
+            texts.append(name.casefold())
+            text_rows.append(row)
+        if english_names is not None:
+            for row, name in enumerate(english_names):
+                if isinstance(name, str) and name and name != 'UNKNOWN':
+                    texts.append(name.casefold())
+                    text_rows.append(row)
+        self.names = StringArray.from_strings(names)
+        self.texts = StringArray.from_strings(texts)
+        self.text_rows = np.asarray(text_rows, dtype=np.int32)
+
+        # O(log n) exact lookups: sorted string hashes -> row / text ids (verified against the strings)
+        self.name_hashes, self.name_ids = self._hash_table(names)
+        self.text_hashes, self.text_ids = self._hash_table(texts)
+
+        # Trigram postings: sorted gram codes -> text ids (CSR)
+        postings = {}
+        gram_counts = np.zeros(len(texts), dtype=np.int32)
+        for i, text in enumerate(texts):
+            grams = self._grams(text)
+            gram_counts[i] = len(grams)
+            for gram in grams:
+                postings.setdefault(self._code(gram), []).append(i)
+        self.gram_codes = np.array(sorted(postings), dtype=np.int64)
+        lists = [postings[code] for code in self.gram_codes.tolist()]
+        self.gram_offsets = np.zeros(len(lists) + 1, dtype=np.int64)
+        np.cumsum([len(ids) for ids in lists], out=self.gram_offsets[1:])
+        self.gram_ids = np.fromiter((i for ids in lists for i in ids), dtype=np.int32, count=self.gram_offsets[-1])
+        self.gram_counts = gram_counts
+
+    def save(self, path):
+        for name, arr in self._arrays().items():
+            np.save(os.path.join(path, f'title_{name}.npy'), arr)
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        index = cls.__new__(cls)
+        arrays = {name: np.load(os.path.join(path, f'title_{name}.npy'), mmap_mode=mmap_mode) for name in cls.FILES}
+        index.names = StringArray(arrays.pop('names_data'), arrays.pop('names_offsets'))
+        index.texts = StringArray(arrays.pop('texts_data'), arrays.pop('texts_offsets'))
+        for name, arr in arrays.items():
+            setattr(index, name, arr.view(np.ndarray))
+        return index
+
+    def _arrays(self):
+        arrays = {name: getattr(self, name) for name in self.FILES if not name.startswith(('names_', 'texts_'))}
+        for prefix, strings in [('names', self.names), ('texts', self.texts)]:
+            arrays.update({f'{prefix}_{name}': arr for name, arr in strings.arrays().items()})
+        return arrays
+
+    @staticmethod
+    def _hash(text):
+        # Stable across processes (unlike hash()), so saved tables stay valid
+        return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'little')
+
+    @classmethod
+    def _hash_table(cls, strings):
+        hashes = np.fromiter((cls._hash(s) for s in strings), dtype=np.uint64, count=len(strings))
+        order = np.argsort(hashes, kind='stable')
+        return hashes[order], order.astype(np.int32)
+
+    def _lookup(self, hashes, ids, strings, query):
+        """Ids whose string equals `query`."""
+        key = np.uint64(self._hash(query))
+        start, end = np.searchsorted(hashes, key, side='left'), np.searchsorted(hashes, key, side='right')
+        return [i for i in ids[start:end] if strings[i] == query]
+
+    @classmethod
+    def _grams(cls, text):
+        return {text[i:i + cls.NGRAM] for i in range(len(text) - cls.NGRAM + 1)}
+
+    @staticmethod
+    def _code(gram):
+        # Three code points (< 2**21 each) packed into one int64
+        return (ord(gram[0]) << 42) | (ord(gram[1]) << 21) | ord(gram[2])
+
+    def _postings(self, grams):
+        """Postings (text ids) of each gram, None for grams not in the index."""
+        if not len(self.gram_codes):
+            return [None] * len(grams)
+        codes = np.array([self._code(gram) for gram in grams], dtype=np.int64)
+        slots = np.searchsorted(self.gram_codes, codes).clip(max=len(self.gram_codes) - 1)
+        return [self.gram_ids[self.gram_offsets[slot]:self.gram_offsets[slot + 1]] if self.gram_codes[slot] == code else None
+                for slot, code in zip(slots, codes)]
+
+    def _rank(self, rows):
+        rows = np.unique(np.asarray(rows, dtype=np.intp))
+        return rows[np.lexsort((rows, -self.rank_key[rows]))]
+
+    def _substring(self, query):
+        grams = self._grams(query)
+        if not grams:
+            # Too short for trigrams: plain scan
+            return self.texts.find(query)
+
+        lists = self._postings(grams)
+        if any(ids is None for ids in lists):
+            return []
+
+        # Intersect postings (smallest first), then verify the actual substring
+        lists.sort(key=len)
+        candidates = lists[0]
+        for ids in lists[1:]:
+            candidates = np.intersect1d(candidates, ids, assume_unique=True)
+            if not len(candidates):
+                return []
+        return [i for i in candidates if query in self.texts[i]]
+
+    def _fuzzy(self, query):
+        grams = self._grams(query)
+        lists = [ids for ids in self._postings(grams) if ids is not None] if grams else []
+        if not lists:
+            return []
+
+        # Dice coefficient on trigram sets
+        hits = np.bincount(np.concatenate(lists), minlength=len(self.texts))
+        dice = 2.0 * hits / (len(grams) + self.gram_counts)
+        best = dice.max()
+        if best < self.FUZZY_THRESHOLD:
+            return []
+        return np.flatnonzero(dice == best)
+
+    def search(self, query, limit=None):
+        """Returns matching row positions, best match first."""
+        if not isinstance(query, str) or not query.strip():
+            return np.empty(0, dtype=np.intp)
+
+        rows = self._lookup(self.name_hashes, self.name_ids, self.names, query)
+        if rows:
+            rows = self._rank(rows)
+        else:
+            folded = query.casefold()
+            text_ids = self._lookup(self.text_hashes, self.text_ids, self.texts, folded)
+            if not text_ids:
+                text_ids = self._substring(folded)
+                if not len(text_ids):
+                    text_ids = self._fuzzy(folded)
+            rows = self._rank(self.text_rows[np.asarray(text_ids, dtype=np.intp)])
+
+        return rows if limit is None else rows[:limit]
+
+    def resolve(self, query):
+        """Returns the row position of the best match, or None."""
+        rows = self.search(query, limit=1)
+        return int(rows[0]) if len(rows) else None
@@ -0,0 +1,33 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+# src/ and benchmarks/ are imported from the repository root (no installed package)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import make_anime, iter_ratings
+from src.data_loader import RAW_ANIME_RENAMES
+
+
+@pytest.fixture(scope='session')
+def catalogue():
+    """Small processed (anime_df, ratings_df): 300 synthetic anime, one rating per (user, anime)."""
+    anime_df, topics = make_anime(300, seed=1)
+    anime_df = anime_df.rename(columns=RAW_ANIME_RENAMES)
+    users, items, scores = next(iter_ratings(anime_df['anime_id'].to_numpy(), topics, 200, 12_000, seed=1))
+    ratings_df = pd.DataFrame({'user_id': users, 'anime_id': items, 'rating': scores})
+    ratings_df = ratings_df.drop_duplicates(['user_id', 'anime_id']).reset_index(drop=True)
+    return anime_df, ratings_df
+
+
+@pytest.fixture
+def anime_df(catalogue):
+    return catalogue[0].copy()
+
+
+@pytest.fixture
+def ratings_df(catalogue):
+    return catalogue[1].copy()
+
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from src.ann import ExactIndex, IVFIndex, benchmark, load_index
+
+
+@pytest.fixture
+def vectors():
+    vectors = np.random.default_rng(0).standard_normal((500, 16)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def assert_same_search(ivf, exact, queries, k=20):
+    for q in queries:
+        ids, scores = ivf.search(exact.vector(q), k, exclude=q, n_probe=len(ivf.centroids))
+        exact_ids, exact_scores = exact.search(exact.vector(q), k, exclude=q)
+        np.testing.assert_array_equal(ids, exact_ids)
+        np.testing.assert_allclose(scores, exact_scores, rtol=1e-5)
+
+
+def test_ivf_probing_every_list_is_exact(vectors):
+    ivf = IVFIndex(vectors, n_lists=16)
+    assert_same_search(ivf, ExactIndex(vectors), range(0, 500, 25))
+    recall = {row['n_probe']: row['recall'] for row in benchmark(vectors, k=20, n_queries=50, n_probes=(1, 16), n_lists=16)}
+    assert recall[16] == 1.0
+    assert recall[1] < 1.0
+
+
+def test_ivf_update_and_reload(vectors):
+    ivf, exact = IVFIndex(vectors[:450], n_lists=16), ExactIndex(vectors[:450])
+    # Changed and new vectors are re-filed under the fixed centroids
+    ids = np.array([3, 7, 460, 499])
+    moved = vectors[[10, 20, 460, 499]]
+    ivf.update(ids, moved)
+    exact.update(ids, moved)
+    assert_same_search(ivf, exact, [3, 7, 100, 460])
+
+    reloaded = load_index('ivf', ivf.arrays(), n_probe=4)
+    np.testing.assert_array_equal(reloaded.vector(460), vectors[460])
+    assert_same_search(reloaded, exact, [3, 460])
@@ -0,0 +1,123 @@
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import generate
+from src.data_loader import BYTES_PER_RATING, DataLoader
+
+
+@pytest.fixture(scope='session')
+def raw_csvs(tmp_path_factory):
+    out_dir = str(tmp_path_factory.mktemp('raw'))
+    generate(out_dir, n_anime=300, n_users=300, n_ratings=20_000, seed=3)
+    return out_dir
+
+
+def copy_raw(raw_dir, data_dir):
+    for name in ['anime-dataset-2023.csv', 'final_animedataset.csv']:
+        shutil.copy(os.path.join(raw_dir, name), os.path.join(data_dir, name))
+    return data_dir
+
+
+@pytest.fixture
+def data_dir(raw_csvs, tmp_path):
+    return copy_raw(raw_csvs, str(tmp_path))
+
+
+def rows(ratings_df):
+    return set(zip(ratings_df['user_id'].tolist(), ratings_df['anime_id'].tolist(), ratings_df['rating'].tolist()))
+
+
+def reference(data_dir, anime_ids, min_ratings):
+    """The stream filter in pandas: active users and anime by valid ratings, then the final user filter."""
+    raw = pd.read_csv(os.path.join(data_dir, 'final_animedataset.csv'))
+    raw = raw[(raw['my_score'] > 0) & raw['anime_id'].isin(anime_ids)]
+    user_counts, anime_counts = raw['user_id'].value_counts(), raw['anime_id'].value_counts()
+    kept = raw[raw['user_id'].isin(user_counts.index[user_counts >= min_ratings])
+               & raw['anime_id'].isin(anime_counts.index[anime_counts >= min_ratings])]
+    counts = kept['user_id'].value_counts()
+    kept = kept[kept['user_id'].isin(counts.index[counts >= min_ratings])]
+    return kept.rename(columns={'my_score': 'rating'}), user_counts
+
+
+@pytest.mark.parametrize('min_ratings', [3, 10])
+def test_stream_matches_filter(data_dir, min_ratings):
+    loader = DataLoader(data_dir, ratings_mode='stream', min_user_ratings=min_ratings, min_anime_ratings=min_ratings)
+    anime_df, ratings_df = loader.load_data()
+    expected, _ = reference(data_dir, anime_df['anime_id'], min_ratings)
+    assert len(ratings_df) == len(expected)
+    assert rows(ratings_df) == rows(expected)
+    assert ratings_df['user_id'].value_counts().min() >= min_ratings
+
+
+def budget_loader(data_dir, max_rows, reservoir):
+    return DataLoader(data_dir, ratings_mode='stream', memory_budget_mb=max_rows * BYTES_PER_RATING / 2**20,
+                      reservoir=reservoir, chunk_size=1000)
+
+
+def test_stream_budget_keeps_most_active_users(data_dir):
+    anime_df, ratings_df = budget_loader(data_dir, 3000, reservoir=False).load_data()
+    expected, user_counts = reference(data_dir, anime_df['anime_id'], 10)
+
+    assert len(expected) > 3000
+    assert 0 < len(ratings_df) <= 3000
+    # Whole users, most active first
+    kept = ratings_df['user_id'].unique()
+    dropped = np.setdiff1d(expected['user_id'].unique(), kept)
+    assert user_counts[kept].min() >= user_counts[dropped].max()
+    assert rows(ratings_df) == rows(expected[expected['user_id'].isin(kept)])
+
+
+def test_stream_reservoir_samples_whole_file(data_dir, tmp_path_factory):
+    anime_df, ratings_df = budget_loader(data_dir, 3000, reservoir=True).load_data()
+    expected, _ = reference(data_dir, anime_df['anime_id'], 10)
+    assert 0 < len(ratings_df) <= 3000
+    assert rows(ratings_df) <= rows(expected)
+
+    # Sampled rows come from the whole file, not mostly from its start (chunks of 1000 rows)
+    raw = pd.read_csv(os.path.join(data_dir, 'final_animedataset.csv')).rename(columns={'my_score': 'rating'})
+    position = raw.reset_index().merge(ratings_df.drop_duplicates())['index'] / len(raw)
+    assert 0.45 < position.mean() < 0.55
+    assert position.min() < 0.1 and position.max() > 0.9
+
+    # Some ratings of many users, where the budget only fits a few whole users
+    _, top_df = budget_loader(copy_raw(data_dir, str(tmp_path_factory.mktemp('top'))), 3000, reservoir=False).load_data()
+    assert ratings_df['user_id'].nunique() > 2 * top_df['user_id'].nunique()
+
+
+def concat(blocks):
+    return [np.concatenate(parts) for parts in zip(*blocks)]
+
+
+@pytest.mark.parametrize('range_bytes', [7, 4096])
+@pytest.mark.parametrize('valid_only', [True, False])
+def test_parallel_ranges_match_serial(data_dir, range_bytes, valid_only):
+    path = os.path.join(data_dir, 'final_animedataset.csv')
+    if range_bytes < 16:
+        # Shorter than a line, so most range boundaries snap to the same line start (one task per line: a short file)
+        with open(path) as f:
+            head = [next(f) for _ in range(500)]
+        with open(path, 'w') as f:
+            f.writelines(head)
+    serial = concat(DataLoader(data_dir)._iter_ratings(path, valid_only=valid_only))
+    parallel = concat(DataLoader(data_dir, workers=2, range_bytes=range_bytes)._iter_ratings(path, valid_only=valid_only))
+    for expected, actual in zip(serial, parallel):
+        np.testing.assert_array_equal(actual, expected)
+
+
+def test_parallel_ingestion_matches_serial(raw_csvs, tmp_path):
+    results = []
+    for workers in [1, 2]:
+        (tmp_path / str(workers)).mkdir()
+        loader = DataLoader(copy_raw(raw_csvs, str(tmp_path / str(workers))), ratings_mode='stream',
+                            workers=workers, range_bytes=4096)
+        loaded = loader.load_data()
+        converted = pd.concat([pd.read_parquet(part) for part in loader._raw_parquet_parts()], ignore_index=True)
+        results.append((loaded, converted))
+    ((anime_1, ratings_1), converted_1), ((anime_2, ratings_2), converted_2) = results
+    pd.testing.assert_frame_equal(ratings_1, ratings_2)
+    pd.testing.assert_frame_equal(anime_1, anime_2)
+    pd.testing.assert_frame_equal(converted_1, converted_2)
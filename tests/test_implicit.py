@@ -0,0 +1,38 @@
+import numpy as np
+
+from src.models import ImplicitRecommender
+
+
+def als_loss(engine):
+    """Weighted ALS objective: sum of c_ui (p_ui - x_u . y_i)^2 + reg * (|X|^2 + |Y|^2)."""
+    preference = engine.interactions.toarray()
+    confidence = 1 + engine.alpha * preference
+    error = preference - engine.user_factors @ engine.item_vectors.T
+    penalty = np.sum(engine.user_factors ** 2) + np.sum(engine.item_vectors ** 2)
+    return np.sum(confidence * error ** 2) + engine.regularization * penalty
+
+
+def test_training_loss_decreases(ratings_df):
+    losses = []
+    for iterations in [1, 2, 4, 8]:
+        # Same seed: each run continues the sweeps of the previous one
+        engine = ImplicitRecommender(ratings_df, factors=8, iterations=iterations, workers=1)
+        engine.fit()
+        losses.append(als_loss(engine))
+    assert all(np.diff(losses) < 0), losses
+
+
+def test_recommendations_exclude_seed(ratings_df):
+    engine = ImplicitRecommender(ratings_df, factors=8, iterations=5, workers=1)
+    engine.fit()
+    for anime_id in engine.anime_ids[:20]:
+        recs = engine.get_recommendations(anime_id, top_n=10)
+        assert len(recs) == 10
+        assert anime_id not in recs
+
+    found, rec_ids, _ = engine.get_recommendations_batch(engine.anime_ids[:20], top_n=10)
+    assert found.all()
+    assert not (rec_ids == engine.anime_ids[:20, np.newaxis]).any()
+
+    recs = engine.get_profile_recommendations(engine.anime_ids[:3], top_n=10)
+    assert not set(engine.anime_ids[:3]) & set(recs)
@@ -0,0 +1,34 @@
+import pytest
+
+from src.data_loader import DataLoader
+from src.model_store import CurrentModel, ModelStore
+
+
+@pytest.fixture
+def store(tmp_path, anime_df, ratings_df):
+    loader = DataLoader(str(tmp_path / 'data'))
+    (tmp_path / 'data').mkdir()
+    loader._save(*loader._compact(anime_df, ratings_df))
+    return ModelStore(str(tmp_path / 'models')), loader
+
+
+def test_current_model_reloads_after_refit(store):
+    store, loader = store
+    current = CurrentModel(store, store.load_or_build(loader, min_df=1), check_every=0)
+    model = current.get()
+    assert current.get() is model
+
+    # Same data and parameters: the refit replaces the artifact under the same key
+    store.build(loader, replace=True, min_df=1)
+    reloaded = current.get()
+    assert reloaded is not model
+    assert reloaded.model_key == model.model_key
+    assert current.get() is reloaded
+
+
+def test_current_model_waits_for_check_interval(store):
+    store, loader = store
+    current = CurrentModel(store, store.load_or_build(loader, min_df=1), check_every=3600)
+    model = current.get()
+    store.build(loader, replace=True, min_df=1)
+    assert current.get() is model
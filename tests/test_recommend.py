@@ -0,0 +1,21 @@
+import pytest
+
+from src.models import HybridRecommender
+
+
+@pytest.fixture(scope='module')
+def model(catalogue):
+    anime_df, ratings_df = catalogue
+    model = HybridRecommender(anime_df.copy(), ratings_df, cache_size=0, min_df=1)
+    model.fit(parallel=False)
+    return model
+
+
+def test_recommend_batch_keys(model):
+    anime_id = int(model.anime_df['anime_id'].iloc[5])
+    output = model.recommend_batch([anime_id, 999999, anime_id], top_k=3)
+
+    assert list(output) == [anime_id, 999999]
+    assert all(type(key) is int for key in output)
+    assert output[999999] == []
+    assert output[anime_id] == model.recommend(model.anime_df['name'].iloc[5], top_k=3)[0]
@@ -0,0 +1,32 @@
+import numpy as np
+from scipy.sparse import csr_matrix
+from sklearn.decomposition import TruncatedSVD
+
+from src.models import CollaborativeRecommender
+
+
+def rating_blocks(ratings_df, block_rows):
+    arrays = [ratings_df[col].to_numpy() for col in ['user_id', 'anime_id', 'rating']]
+
+    def blocks():
+        for start in range(0, len(arrays[0]), block_rows):
+            yield tuple(values[start:start + block_rows] for values in arrays)
+    return blocks
+
+
+def test_fit_streaming_matches_truncated_svd(ratings_df):
+    ratings_df = ratings_df[ratings_df['rating'] > 0]
+    engine = CollaborativeRecommender(None, n_components=12, n_iter=5)
+    engine.fit_streaming(rating_blocks(ratings_df, 1000), min_user_ratings=1, block_rows=500)
+
+    # Same anime x user matrix, in memory
+    items, users = np.unique(ratings_df['anime_id']), np.unique(ratings_df['user_id'])
+    matrix = csr_matrix((ratings_df['rating'].to_numpy(dtype=np.float64),
+                         (np.searchsorted(items, ratings_df['anime_id']), np.searchsorted(users, ratings_df['user_id']))))
+    svd = TruncatedSVD(n_components=12, n_iter=5, random_state=42).fit(matrix)
+
+    np.testing.assert_array_equal(engine.anime_ids, items)
+    np.testing.assert_allclose(engine.singular_values, svd.singular_values_, rtol=1e-2)
+    # Leading factors span the same directions (up to sign)
+    cosines = np.abs(np.sum(engine.components[:3] * svd.components_[:3], axis=1))
+    np.testing.assert_allclose(cosines, 1.0, atol=1e-3)
@@ -0,0 +1,50 @@
+import pytest
+
+from src.title_index import TitleIndex
+
+NAMES = ['Naruto', 'naruto', 'Naruto Shippuden', 'Bleach', 'One Piece']
+ENGLISH = ['UNKNOWN', None, 'Naruto: Hurricane', 'Bleach EN', 'OP']
+RATINGS = [7.0, 9.0, 8.0, 6.0, 8.5]
+
+
+@pytest.fixture(params=['built', 'loaded'])
+def index(request, tmp_path):
+    index = TitleIndex(NAMES, ENGLISH, RATINGS)
+    if request.param == 'loaded':
+        index.save(str(tmp_path))
+        index = TitleIndex.load(str(tmp_path))
+    return index
+
+
+def search(index, query):
+    return [int(row) for row in index.search(query)]
+
+
+def test_exact_name_wins(index):
+    # 'naruto' is better rated, but only 'Naruto' is an exact hit
+    assert search(index, 'Naruto') == [0]
+    assert index.resolve('naruto') == 1
+
+
+def test_case_folded_names_by_rating(index):
+    assert search(index, 'NARUTO') == [1, 0]
+    assert search(index, 'bleach en') == [3]
+
+
+def test_substring_by_rating(index):
+    assert search(index, 'ruto') == [1, 2, 0]
+    assert search(index, 'hurricane') == [2]
+    # Shorter than a trigram: plain scan
+    assert search(index, 'op') == [4]
+
+
+def test_fuzzy(index):
+    assert search(index, 'Narutp') == [1, 0]
+    assert search(index, 'Bleech') == []
+
+
+def test_no_match(index):
+    assert search(index, 'zzzz') == []
+    assert search(index, ' ') == []
+    assert index.resolve('zzzz') is None
+    assert list(index.search('ruto', limit=2)) == [1, 2]
@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import make_anime, iter_ratings
+from src.data_loader import RAW_ANIME_RENAMES
+from src.models import CollaborativeRecommender, HybridRecommender
+
+K = 10
+
+
+def assert_same_table(model):
+    table = model.rec_table
+    model.build_table(k=K, weights=table.weights)
+    np.testing.assert_array_equal(table.positions, model.rec_table.positions)
+    np.testing.assert_allclose(table.scores, model.rec_table.scores, rtol=1e-6)
+
+
+@pytest.fixture
+def updated(anime_df, ratings_df):
+    """A model fitted on 90% of the anime and 80% of the ratings, then update()d with the rest."""
+    old_ids = anime_df['anime_id'].iloc[:270]
+    base_ratings = ratings_df.iloc[:int(len(ratings_df) * 0.8)]
+    base_ratings = base_ratings[base_ratings['anime_id'].isin(old_ids)]
+
+    model = HybridRecommender(anime_df.iloc[:270].copy(), base_ratings, cache_size=0, min_df=1)
+    model.fit(parallel=False)
+    model.build_table(k=K)
+    model.precompute_neighbors(k=K)
+    affected = model.update(anime_df.iloc[270:].copy(), ratings_df.drop(base_ratings.index))
+    return model, affected
+
+
+def test_update_table_matches_full_build(updated):
+    model, affected = updated
+    assert len(model.anime_df) == 300
+    assert len(affected)
+    assert_same_table(model)
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2, 3])
+def test_small_update_table_matches_full_build(seed):
+    # A few ratings on a larger catalogue: most rows are kept, so the staleness test matters
+    anime_df, topics = make_anime(1500, seed=seed)
+    anime_df = anime_df.rename(columns=RAW_ANIME_RENAMES)
+    users, items, scores = next(iter_ratings(anime_df['anime_id'].to_numpy(), topics, 400, 40_000, seed=seed))
+    ratings_df = pd.DataFrame({'user_id': users, 'anime_id': items, 'rating': scores})
+    new_ratings = ratings_df.sample(15, random_state=seed)
+
+    model = HybridRecommender(anime_df, ratings_df.drop(new_ratings.index), cache_size=0, min_df=1)
+    model.fit(parallel=False)
+    model.build_table(k=K)
+    model.update(new_ratings_df=new_ratings)
+    assert_same_table(model)
+
+
+def test_update_neighbors_match_full_build(updated):
+    model, _ = updated
+    content = model.content_engine
+    positions, scores = content.neighbor_positions, content.neighbor_scores
+    assert len(positions) == 300
+
+    content.precompute_neighbors(k=K)
+    np.testing.assert_array_equal(positions, content.neighbor_positions)
+    np.testing.assert_allclose(scores, content.neighbor_scores, rtol=1e-6)
+
+
+def test_partial_fit_folds_in_user_like_fit(ratings_df):
+    # v_u = x_u @ item_matrix / sigma^2 is fit()'s component vector of a user it trained on
+    # (exactly once the randomized SVD has converged, hence the extra power iterations)
+    ratings_df = ratings_df[ratings_df['rating'] > 0]
+    engine = CollaborativeRecommender(ratings_df, n_iter=30)
+    engine.fit()
+    user = ratings_df['user_id'].value_counts().index[0]
+    column = np.flatnonzero(engine.user_ids == user)[0]
+    expected = engine.components[:, column].copy()
+
+    # The same ratings again, from a user id the model has never seen
+    copy = ratings_df[ratings_df['user_id'] == user].assign(user_id=ratings_df['user_id'].max() + 1)
+    engine.partial_fit(copy)
+    np.testing.assert_allclose(engine.components[:, -1], expected, rtol=1e-6, atol=1e-9)